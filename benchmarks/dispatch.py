@@ -0,0 +1,66 @@
+import os
+import sys
+from argparse import ArgumentParser
+from time import perf_counter
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from simulators.base import Simulator
+from qasm.tokenizer import Tokenizer
+from qasm.parser import Parser
+from lib.circuit import QuantumCircuit, CircuitOp
+from lib.compiled import CompiledCircuit
+
+class NullSimulator(Simulator):
+    # Gates and measurements that do nothing, so only the interpreter is timed
+    def __init__(self, nqubits: int) -> None:
+        super().__init__(nqubits)
+        self.nqubits = nqubits
+        self._gates = {'h': self.nop, 'cx': self.nop}
+    
+    def nop(self, *args) -> None:
+        pass
+    
+    def measure(self, target: int, basis: int = Simulator.Z_BASIS) -> int:
+        return 0
+
+def ghz_qasm(nqubits: int) -> str:
+    # test/ghz.qasm scaled to nqubits
+    lines = ['OPENQASM 2.0;', f'qreg q[{nqubits}];', f'creg c[{nqubits}];', 'h q[0];']
+    lines.extend(f'cx q[{i}], q[{i + 1}];' for i in range(nqubits - 1))
+    lines.append('measure q -> c;')
+    return '\n'.join(lines)
+
+def interpreted(circ: QuantumCircuit, sim) -> str:
+    # Per-op loop over the operation tuples, as Executor.run did before compiling
+    for op, name, *args in circ.operations:
+        if op == CircuitOp.APPLY:
+            sim.apply_gate(name, *args)
+        elif op == CircuitOp.MEASURE:
+            circ._set_bitval(args[1], sim.measure(args[0]))
+        elif op == CircuitOp.IF:
+            if args[0] == args[1].to_int():
+                for _, name, *qubits in args[2]:
+                    sim.apply_gate(name, *qubits)
+    res = ''
+    for name in circ._creg:
+        res = circ._creg[name].to_binary_string() + res
+    return res
+
+def seconds_per_shot(run, backend, nqubits: int, shots: int) -> float:
+    start = perf_counter()
+    for _ in range(shots):
+        run(backend(nqubits))
+    return (perf_counter() - start) / shots
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Interpreter overhead of the tuple and compiled executors')
+    parser.add_argument('--qubits', type=int, default=10000)
+    parser.add_argument('--shots', type=int, default=20)
+    args = parser.parse_args()
+    
+    circ = QuantumCircuit.from_qasm(Parser(Tokenizer(ghz_qasm(args.qubits))).parse())
+    compiled = CompiledCircuit(circ)
+    nops = len(circ.operations)
+    old = seconds_per_shot(lambda sim: interpreted(circ, sim), NullSimulator, args.qubits, args.shots)
+    new = seconds_per_shot(compiled.execute, NullSimulator, args.qubits, args.shots)
+    print(f'{nops} ops: {1e9 * old / nops:.0f} ns/op interpreted, {1e9 * new / nops:.0f} ns/op compiled ({old / new:.1f}x)')
@@ -0,0 +1,49 @@
+import os
+import sys
+from argparse import ArgumentParser
+from time import perf_counter
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from simulators.tableau import TableauSimulator
+from qasm.tokenizer import Tokenizer
+from qasm.parser import Parser
+from lib.circuit import QuantumCircuit
+from lib.compiled import CompiledCircuit
+from lib.frame import PauliFrameSampler
+
+def syndrome_qasm(distance: int, rounds: int) -> str:
+    # Repetition code on distance data qubits prepared in a GHZ state, with the
+    # distance - 1 parity ancillas measured and reset every round
+    lines = ['OPENQASM 2.0;', f'qreg d[{distance}];', f'qreg a[{distance - 1}];', f'creg data[{distance}];']
+    lines.extend(f'creg s{r}[{distance - 1}];' for r in range(rounds))
+    lines.append('h d[0];')
+    lines.extend(f'cx d[{i}], d[{i + 1}];' for i in range(distance - 1))
+    for r in range(rounds):
+        for i in range(distance - 1):
+            lines.append(f'cx d[{i}], a[{i}];')
+            lines.append(f'cx d[{i + 1}], a[{i}];')
+        lines.append(f'measure a -> s{r};')
+        lines.append('reset a;')
+    lines.append('measure d -> data;')
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Per-shot replay against Pauli frame sampling of a syndrome circuit')
+    parser.add_argument('--distance', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--shots', type=int, default=1000000)
+    parser.add_argument('--replay-shots', type=int, default=1, help='shots replayed to estimate the per-shot time')
+    args = parser.parse_args()
+    
+    circ = QuantumCircuit.from_qasm(Parser(Tokenizer(syndrome_qasm(args.distance, args.rounds))).parse())
+    compiled = CompiledCircuit(circ)
+    
+    start = perf_counter()
+    for _ in range(args.replay_shots):
+        compiled.execute(TableauSimulator(compiled.nqubits))
+    replay = (perf_counter() - start) / args.replay_shots * args.shots
+    
+    start = perf_counter()
+    counts = PauliFrameSampler(compiled).sample(TableauSimulator(compiled.nqubits), args.shots).counts()
+    frames = perf_counter() - start
+    print(f'{compiled.nqubits} qubits, {len(compiled.program)} ops, {args.shots} shots: {replay:.1f} s replayed (estimated), {frames:.1f} s with Pauli frames, {len(counts)} distinct outcomes')
@@ -0,0 +1,56 @@
+import os
+import sys
+import random
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from simulators.clifford import GraphStateSimulator
+from simulators.compact import CompactGraphStateSimulator
+
+SINGLE_QUBIT_GATES = ['x', 'y', 'z', 'h', 's', 'sdg']
+TWO_QUBIT_GATES = ['cx', 'cz']
+
+def random_circuit(nqubits: int, ngates: int, locality: int, seed: int):
+    rng = random.Random(seed)
+    circuit = []
+    for _ in range(ngates):
+        if rng.random() < 0.5:
+            circuit.append((rng.choice(SINGLE_QUBIT_GATES), rng.randrange(nqubits)))
+        else:
+            a = rng.randrange(nqubits)
+            b = (a + rng.randint(1, locality)) % nqubits
+            circuit.append((rng.choice(TWO_QUBIT_GATES), a, b))
+    return circuit
+
+def memory_per_qubit(backend, nqubits: int, circuit) -> float:
+    tracemalloc.start()
+    sim = backend(nqubits)
+    for name, *args in circuit:
+        sim.apply_gate(name, *args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / nqubits
+
+def gates_per_second(backend, nqubits: int, circuit) -> float:
+    sim = backend(nqubits)
+    start = perf_counter()
+    for name, *args in circuit:
+        sim.apply_gate(name, *args)
+    return len(circuit) / (perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Memory and speed of the graph state backends')
+    parser.add_argument('--qubits', type=int, default=100000)
+    parser.add_argument('--gates', type=int, default=200000)
+    parser.add_argument('--locality', type=int, default=4, help='maximum distance between qubits of a two-qubit gate')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    circuit = random_circuit(args.qubits, args.gates, args.locality, args.seed)
+    for backend in [GraphStateSimulator, CompactGraphStateSimulator]:
+        random.seed(args.seed)
+        memory = memory_per_qubit(backend, args.qubits, circuit)
+        speed = gates_per_second(backend, args.qubits, circuit)
+        print(f'{backend.__name__:>28}: {memory:8.1f} bytes/qubit, {speed:10.0f} gates/s')
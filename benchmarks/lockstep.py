@@ -0,0 +1,37 @@
+import os
+import sys
+from argparse import ArgumentParser
+from time import perf_counter
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from simulators.compact import CompactGraphStateSimulator
+from simulators.lockstep import LockstepGraphStateSimulator
+from qasm.tokenizer import Tokenizer
+from qasm.parser import Parser
+from lib.circuit import QuantumCircuit
+from lib.executor import Executor
+from frames import syndrome_qasm
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Per-shot replay against lockstep shots of a syndrome circuit with feedback')
+    parser.add_argument('--distance', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--shots', type=int, default=10000)
+    parser.add_argument('--replay-shots', type=int, default=10, help='shots replayed to estimate the per-shot time')
+    args = parser.parse_args()
+    
+    # A Hadamard conditioned on the first syndrome keeps the circuit off the Pauli frame path
+    code = syndrome_qasm(args.distance, args.rounds).replace('measure d -> data;', 'if(s0==0) h d[0];\nmeasure d -> data;')
+    circ = QuantumCircuit.from_qasm(Parser(Tokenizer(code)).parse())
+    executor = Executor(circ)
+    compiled = executor.compiled()
+    
+    start = perf_counter()
+    for _ in range(args.replay_shots):
+        compiled.execute(CompactGraphStateSimulator(compiled.nqubits))
+    replay = (perf_counter() - start) / args.replay_shots * args.shots
+    
+    start = perf_counter()
+    counts = executor.run(LockstepGraphStateSimulator, args.shots)
+    lockstep = perf_counter() - start
+    print(f'{compiled.nqubits} qubits, {len(compiled.program)} ops, {args.shots} shots: {replay:.1f} s replayed (estimated), {lockstep:.1f} s in lockstep, {len(counts)} distinct outcomes')
@@ -0,0 +1,41 @@
+import os
+import sys
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from simulators.clifford import GraphStateSimulator
+
+class ArbitraryPartnerSimulator(GraphStateSimulator):
+    # Previous behaviour: any neighbour other than b
+    def swap_partner(self, qubit_a: int, qubit_b: int) -> int:
+        return self.vertices[qubit_a].diff({qubit_b}).pop()
+
+def dense_clifford_circuit(nqubits: int, ngates: int, seed: int):
+    rng = random.Random(seed)
+    circuit = []
+    for _ in range(ngates):
+        if rng.random() < 0.6:
+            circuit.append((rng.choice(['h', 's', 'sdg', 'x', 'z']), rng.randrange(nqubits)))
+        else:
+            a, b = rng.sample(range(nqubits), 2)
+            circuit.append((rng.choice(['cx', 'cz']), a, b))
+    return circuit
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Cost of remove_vop with arbitrary and lowest-degree swap partners')
+    parser.add_argument('--qubits', type=int, default=60)
+    parser.add_argument('--gates', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    circuit = dense_clifford_circuit(args.qubits, args.gates, args.seed)
+    for backend in [ArbitraryPartnerSimulator, GraphStateSimulator]:
+        sim = backend(args.qubits)
+        start = perf_counter()
+        for name, *qubits in circuit:
+            sim.apply_gate(name, *qubits)
+        elapsed = perf_counter() - start
+        print(f'{backend.__name__:>26}: {sim.local_complementations:8d} local complementations, '
+              f'{sim.edge_toggles:10d} edge toggles, max degree {sim.max_degree:4d}, {elapsed:6.2f} s')
@@ -0,0 +1,47 @@
+import os
+import sys
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from simulators.statevector import StatevectorSimulator
+from qasm.tokenizer import Tokenizer
+from qasm.parser import Parser
+from lib.circuit import QuantumCircuit
+from lib.executor import Executor
+
+def prepared_qasm(nqubits: int, depth: int) -> str:
+    # Random H, T and CX state preparation, then a measurement with feedback so the
+    # shots can not be sampled from the final state
+    rng = random.Random(0)
+    lines = ['OPENQASM 2.0;', f'qreg q[{nqubits}];', f'creg c[{nqubits}];']
+    for _ in range(depth):
+        a, b = rng.sample(range(nqubits), 2)
+        lines.append(rng.choice([f'h q[{a}];', f't q[{a}];', f'cx q[{a}], q[{b}];']))
+    lines.append('measure q[0] -> c[0];')
+    lines.append('if(c==1) x q[1];')
+    lines.append('measure q -> c;')
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Per-shot replay against a snapshot of the deterministic prefix of a deep state preparation')
+    parser.add_argument('--qubits', type=int, default=12)
+    parser.add_argument('--depth', type=int, default=5000)
+    parser.add_argument('--shots', type=int, default=10000)
+    parser.add_argument('--replay-shots', type=int, default=3, help='shots replayed to estimate the per-shot time')
+    args = parser.parse_args()
+    
+    circ = QuantumCircuit.from_qasm(Parser(Tokenizer(prepared_qasm(args.qubits, args.depth))).parse())
+    executor = Executor(circ)
+    compiled = executor.compiled()
+    
+    start = perf_counter()
+    for _ in range(args.replay_shots):
+        compiled.execute(StatevectorSimulator(compiled.nqubits))
+    replay = (perf_counter() - start) / args.replay_shots * args.shots
+    
+    start = perf_counter()
+    counts = executor.run(StatevectorSimulator, args.shots)
+    snapshot = perf_counter() - start
+    print(f'{compiled.nqubits} qubits, {compiled.prefix()} of {len(compiled.program)} ops before the first measurement, {args.shots} shots: {replay:.1f} s replayed (estimated), {snapshot:.1f} s from the snapshot, {len(counts)} distinct outcomes')
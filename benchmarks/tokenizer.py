@@ -0,0 +1,34 @@
+import os
+import sys
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from qasm.tokenizer import Tokenizer
+
+def synthetic_qasm(nqubits: int, ngates: int, seed: int) -> str:
+    rng = random.Random(seed)
+    lines = ['// Synthetic benchmark circuit', 'OPENQASM 2.0;', f'qreg q[{nqubits}];', f'creg c[{nqubits}];']
+    for _ in range(ngates):
+        if rng.random() < 0.5:
+            lines.append(f'{rng.choice(["h", "s", "x", "z"])} q[{rng.randrange(nqubits)}];')
+        else:
+            a, b = rng.sample(range(nqubits), 2)
+            lines.append(f'cx q[{a}], q[{b}];')
+    lines.append('measure q -> c;')
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Tokenizer throughput on a synthetic QASM file')
+    parser.add_argument('--qubits', type=int, default=1000)
+    parser.add_argument('--gates', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    code = synthetic_qasm(args.qubits, args.gates, args.seed)
+    start = perf_counter()
+    ntokens = sum(1 for _ in Tokenizer(code))
+    elapsed = perf_counter() - start
+    print(f'{args.gates} gates, {len(code) / 2 ** 20:.1f} MiB, {ntokens} tokens in {elapsed:.2f} s '
+          f'({ntokens / elapsed:.0f} tokens/s, {len(code) / 2 ** 20 / elapsed:.1f} MiB/s)')
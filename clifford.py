@@ -1,25 +1,91 @@
+import os
+import sys
 from argparse import ArgumentParser
 from simulators.clifford import GraphStateSimulator
+from simulators.compact import CompactGraphStateSimulator
+from simulators.lockstep import LockstepGraphStateSimulator
 from simulators.statevector import StatevectorSimulator
+from simulators.tableau import TableauSimulator
 from qasm.tokenizer import Tokenizer
 from qasm.parser import Parser
 from lib.executor import Executor
 from lib.circuit import QuantumCircuit
+from lib.cache import CircuitCache
+from lib.optimizer import optimize
+from lib.allocator import reuse_qubits
+from lib.noise import NoiseModel, Channel
+
+BACKENDS = {
+    'statevector': StatevectorSimulator,
+    'clifford': GraphStateSimulator,
+    'compact': CompactGraphStateSimulator,
+    'lockstep': LockstepGraphStateSimulator,
+    'tableau': TableauSimulator
+}
 
 if __name__ == '__main__':
     parser = ArgumentParser(description='Basic QASM implemetation for Clifford Circuits')
     parser.add_argument('file', type=str, help='QASM file program')
-    parser.add_argument('--simulator', type=str, choices=['statevector', 'clifford'], required=True)
+    parser.add_argument('--simulator', type=str, choices=[*BACKENDS, 'auto'], required=True)
+    parser.add_argument('--stream', action='store_true', help='parse and execute a single shot without loading the whole program')
+    parser.add_argument('--cache', type=str, metavar='DIR', help='reuse compiled circuits stored in DIR')
+    parser.add_argument('--optimize', action='store_true', help='fuse single-qubit gates and cancel redundant gates before running')
+    parser.add_argument('--reuse-qubits', action='store_true', help='simulate measured or reset qubits again for qubits first used later')
+    parser.add_argument('--depolarizing', type=float, metavar='P', default=0, help='depolarize the qubits of every gate with probability P')
+    parser.add_argument('--bit-flip', type=float, metavar='P', default=0, help='flip every qubit of every gate and reset with probability P')
+    parser.add_argument('--measurement-flip', type=float, metavar='P', default=0, help='flip every measured bit with probability P')
+    parser.add_argument('--workers', type=int, metavar='N', default=1, help='split the shots across N processes')
+    parser.add_argument('--seed', type=int, help='seed of the random streams, the same seed gives the same shots for any --workers')
     args = parser.parse_args()
-
+    if args.stream and args.simulator == 'auto':
+        parser.error('--stream needs an explicit --simulator, the backend cannot be chosen before the program is read')
+    if args.stream and args.optimize:
+        parser.error('--optimize needs the whole program and can not be combined with --stream')
+    if args.stream and args.reuse_qubits:
+        parser.error('--reuse-qubits needs the whole program and can not be combined with --stream')
+    noisy = args.depolarizing or args.bit_flip or args.measurement_flip
+    if args.stream and noisy:
+        parser.error('noise is only applied to whole programs and can not be combined with --stream')
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if not all(0 <= p <= 1 for p in (args.depolarizing, args.bit_flip, args.measurement_flip)):
+        parser.error('noise probabilities must be between 0 and 1')
+    
+    # Includes are resolved next to the program first
+    include_path = [os.path.dirname(os.path.abspath(args.file))]
     with open(args.file, 'r') as f:
+        if args.stream:
+            circ, operations = QuantumCircuit.stream_qasm(Parser(Tokenizer(f)).stream(), include_path)
+            print(Executor(circ).run_stream(BACKENDS[args.simulator], operations, args.seed))
+            sys.exit(0)
         code = f.read()
-        tokenizer = Tokenizer(code)
-        parser = Parser(tokenizer)
-        qasm = parser.parse()
-        circ = QuantumCircuit.from_qasm(qasm)
-        exec = Executor(circ)
-        if args.simulator == 'statevector':
-            print(exec.run(StatevectorSimulator))
-        elif args.simulator == 'clifford':
-            print(exec.run(GraphStateSimulator))
\ No newline at end of file
+        compiled = None
+        if args.cache:
+            circ, compiled = CircuitCache(args.cache).compile(code, include_path)
+        else:
+            tokenizer = Tokenizer(code)
+            parser = Parser(tokenizer)
+            qasm = parser.parse()
+            circ = QuantumCircuit.from_qasm(qasm, include_path)
+        # The optimizer and the allocator rewrite the operations, which are written back from the cached arrays
+        if compiled is not None and (args.optimize or args.reuse_qubits):
+            circ.operations = compiled.operations(circ)
+            compiled = None
+        if args.optimize:
+            print(f'Optimizer removed {optimize(circ)} operations', file=sys.stderr)
+        if args.reuse_qubits:
+            print(f'Qubit reuse saved {reuse_qubits(circ)} qubits', file=sys.stderr)
+        exec = Executor(circ, compiled)
+        if noisy:
+            circ.noise = NoiseModel()
+            for gate in sorted(exec.profile()['gates']):
+                circ.noise.add_gate_noise(gate, Channel.DEPOLARIZING, args.depolarizing)
+                circ.noise.add_gate_noise(gate, Channel.BIT_FLIP, args.bit_flip)
+            circ.noise.add_gate_noise('reset', Channel.BIT_FLIP, args.bit_flip)
+            circ.noise.add_gate_noise('measure', Channel.MEASUREMENT_FLIP, args.measurement_flip)
+        if args.simulator == 'auto':
+            backend, reason = exec.select_backend()
+            print(f'Using {backend.__name__}: {reason}', file=sys.stderr)
+        else:
+            backend = BACKENDS[args.simulator]
+        print(exec.run(backend, workers=args.workers, seed=args.seed))
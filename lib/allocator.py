@@ -0,0 +1,86 @@
+import heapq
+from typing import Dict, List, Tuple
+from .circuit import QuantumCircuit, CircuitOp
+from .register import QuantumRegister
+
+# Name of the register that holds the simulated qubits after reuse_qubits
+REUSED_REGISTER = 'reused'
+
+class QubitAllocator:
+    # Maps the qubits of a circuit onto as few simulated qubits as possible. A qubit whose
+    # last operation is a measurement or a reset is left in a product state, so once it
+    # is dead its simulated qubit can hold a qubit that is used for the first time later,
+    # after a reset unless the dead qubit already ended with one.
+    def __init__(self, operations: List, nqubits: int) -> None:
+        self.operations = operations
+        self.nqubits = nqubits
+        self._layout: Dict[int, int] = {}
+        # Released simulated qubits as (needs reset, index), clean ones first
+        self._free: List[Tuple[bool, int]] = []
+        self._operations: List = []
+        self.width = 0
+    
+    @staticmethod
+    def _qubits(op: CircuitOp, args) -> List[int]:
+        if op == CircuitOp.IF:
+            return list(dict.fromkeys(qubit for _, _, *body in args[2] for qubit in body))
+        if op == CircuitOp.APPLY:
+            return list(args)
+        return [args[0]]
+    
+    def _live_ranges(self) -> Dict[int, int]:
+        # Index of the operation after which every qubit can be released
+        last = {}
+        for i, (op, name, *args) in enumerate(self.operations):
+            for qubit in QubitAllocator._qubits(op, args):
+                last[qubit] = i
+        return {qubit: i for qubit, i in last.items() if self.operations[i][0] in (CircuitOp.MEASURE, CircuitOp.RESET)}
+    
+    def _allocate(self, qubit: int, op: CircuitOp) -> None:
+        if not self._free:
+            self._layout[qubit] = self.width
+            self.width += 1
+            return
+        dirty, physical = heapq.heappop(self._free)
+        if dirty and op != CircuitOp.RESET:
+            self._operations.append((CircuitOp.RESET, 'reset', physical))
+        self._layout[qubit] = physical
+    
+    def run(self) -> Tuple[List, int]:
+        release = {}
+        for qubit, i in self._live_ranges().items():
+            release.setdefault(i, []).append(qubit)
+        
+        for i, (op, name, *args) in enumerate(self.operations):
+            for qubit in QubitAllocator._qubits(op, args):
+                if qubit not in self._layout:
+                    self._allocate(qubit, op)
+            layout = self._layout
+            if op == CircuitOp.APPLY:
+                self._operations.append((op, name, *(layout[qubit] for qubit in args)))
+            elif op == CircuitOp.MEASURE:
+                self._operations.append((op, name, layout[args[0]], args[1]))
+            elif op == CircuitOp.RESET:
+                self._operations.append((op, name, layout[args[0]]))
+            elif op == CircuitOp.IF:
+                body = [(body_op, gate, *(layout[qubit] for qubit in qubits)) for body_op, gate, *qubits in args[2]]
+                self._operations.append((op, name, args[0], args[1], body))
+            else:
+                raise NotImplementedError(f'{op} operations can not be allocated')
+            for qubit in release.get(i, ()):
+                heapq.heappush(self._free, (op != CircuitOp.RESET, self._layout[qubit]))
+        
+        # Backends need at least one qubit even for an empty circuit
+        return self._operations, max(self.width, 1)
+
+def reuse_qubits(circ: QuantumCircuit) -> int:
+    # Rewrites the operations of circ in place onto fewer qubits and returns how many were saved
+    operations, width = QubitAllocator(circ.operations, circ._qsize).run()
+    saved = circ._qsize - width
+    circ.operations = operations
+    # Qubits of the original registers now share simulated qubits, so the registers are
+    # collapsed into one over the simulated qubits and later lowering can not resolve them
+    reg = QuantumRegister(width, REUSED_REGISTER)
+    circ._qreg = {reg.name: reg}
+    circ._qsize = width
+    return saved
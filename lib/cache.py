@@ -0,0 +1,124 @@
+import os
+import hashlib
+from zipfile import BadZipFile
+import numpy as np
+from typing import Sequence, Tuple, Union
+from .circuit import QuantumCircuit
+from .compiled import CompiledCircuit
+from .register import QuantumRegister, ClassicalRegister
+
+from qasm.tokenizer import Tokenizer
+from qasm.parser import Parser
+
+class CircuitCache:
+    # Layout of the stored arrays, bump it whenever the encoding changes
+    FORMAT = 4
+    
+    def __init__(self, directory: str, max_bytes: int = 256 << 20) -> None:
+        assert max_bytes > 0, 'cache size must be positive'
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+    
+    def key(self, source: str, include_path: Sequence[str] = ()) -> str:
+        digest = hashlib.sha256()
+        digest.update(f'{CircuitCache.FORMAT}:{Parser.REVISION}:{os.pathsep.join(include_path)}:'.encode())
+        digest.update(source.encode())
+        return digest.hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+    
+    def compile(self, source: str, include_path: Sequence[str] = ()) -> Tuple[QuantumCircuit, CompiledCircuit]:
+        # Circuit with its registers and rotations, and its operations compiled without
+        # relabeling. A hit reads the compiled arrays back and never lowers the operations,
+        # so the circuit it returns has none.
+        entry = self.load(source, include_path)
+        if entry is None:
+            circ = QuantumCircuit.from_qasm(Parser(Tokenizer(source)).parse(), include_path)
+            entry = circ, CompiledCircuit(circ, relabel=False)
+            self.store(source, *entry, include_path)
+        return entry
+    
+    def load(self, source: str, include_path: Sequence[str] = ()) -> Union[Tuple[QuantumCircuit, CompiledCircuit], None]:
+        path = self._path(self.key(source, include_path))
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                # Entries built from include files that changed since are stale
+                for include, mtime in zip(data['include_paths'].tolist(), data['include_mtimes'].tolist()):
+                    if not os.path.isfile(include) or os.path.getmtime(include) != mtime:
+                        return None
+                entry = CircuitCache.decode(data)
+        except FileNotFoundError:
+            return None
+        except (OSError, BadZipFile, EOFError, KeyError, ValueError):
+            # Truncated or corrupt entries are misses, and are dropped so they are stored again
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        # Touching the entry keeps the modification times in LRU order, unless another
+        # process evicted it in the meantime
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return entry
+    
+    def store(self, source: str, circ: QuantumCircuit, compiled: CompiledCircuit, include_path: Sequence[str] = ()) -> None:
+        path = self._path(self.key(source, include_path))
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **CircuitCache.encode(circ, compiled))
+        os.replace(tmp, path)
+        self.evict()
+    
+    def evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+    
+    @staticmethod
+    def encode(circ: QuantumCircuit, compiled: CompiledCircuit) -> dict:
+        # The cache keeps the operations as written, swaps included
+        assert compiled.layout == list(range(compiled.nqubits)), 'only circuits compiled without relabeling are cached'
+        return {
+            'qreg_names': np.array(list(circ._qreg), dtype=str),
+            'qreg_sizes': np.array([reg.size for reg in circ._qreg.values()], dtype=np.int64),
+            'creg_names': np.array(list(circ._creg), dtype=str),
+            'creg_sizes': np.array([reg.size for reg in circ._creg.values()], dtype=np.int64),
+            'gates': np.array(compiled.gates, dtype=str),
+            'conditions': compiled.conditions,
+            'origin': np.array(compiled.origin, dtype=np.int64),
+            'unitary_names': np.array(list(circ.unitaries), dtype=str),
+            'unitary_matrices': np.array(list(circ.unitaries.values()), dtype=complex).reshape(-1, 2, 2),
+            'include_paths': np.array([path for path, _ in circ.includes], dtype=str),
+            'include_mtimes': np.array([mtime for _, mtime in circ.includes], dtype=np.float64),
+            **dict(zip(('kind', 'gate', 'q0', 'q1', 'cbit', 'cond'), compiled.arrays()))
+        }
+    
+    @staticmethod
+    def decode(data) -> Tuple[QuantumCircuit, CompiledCircuit]:
+        qreg = [QuantumRegister(int(size), str(name)) for name, size in zip(data['qreg_names'], data['qreg_sizes'])]
+        creg = [ClassicalRegister(int(size), str(name)) for name, size in zip(data['creg_names'], data['creg_sizes'])]
+        circ = QuantumCircuit(qreg, creg)
+        circ.unitaries = dict(zip(data['unitary_names'].tolist(), data['unitary_matrices']))
+        compiled = CompiledCircuit.from_arrays(circ, data['gates'].tolist(), data['conditions'], data['origin'], *(data[k] for k in ('kind', 'gate', 'q0', 'q1', 'cbit', 'cond')))
+        return circ, compiled
@@ -1,14 +1,65 @@
+import os
 import sys
+import math
+import numpy as np
 from enum import Enum
 from itertools import product
-from typing import Union
+from typing import Dict, Iterator, Optional, Sequence, Union
 from .register import QuantumRegister, ClassicalRegister, Register as CircRegister, RegisterType
 from .error import *
 
 sys.path.append('..')
 from qasm.instruction import *
+from qasm.tokenizer import Tokenizer
+from qasm.parser import Parser
+from simulators.clifford import GraphStateSimulator, GATE_VOPS, VOP_NAMES, vop_gate
 
-CircuitOp = Enum('CircuitOp', ['APPLY', 'MEASURE', 'IF', 'GATE'])
+CircuitOp = Enum('CircuitOp', ['APPLY', 'MEASURE', 'IF', 'GATE', 'RESET'])
+
+# Gates implemented by the backends, these take precedence over library definitions
+NATIVE_GATES = {'i', 'x', 'y', 'z', 'h', 's', 'sdg', 't', 'cx', 'cy', 'cz', 'swap'}
+# Builtin gates of OpenQASM that map onto a native gate
+BUILTIN_GATES = {'CX': 'cx'}
+# Single-qubit rotations lowered directly, as the U(theta, phi, lambda) angles of their parameters
+ROTATION_GATES = {
+    'U': lambda theta, phi, lam: (theta, phi, lam),
+    'u3': lambda theta, phi, lam: (theta, phi, lam),
+    'u': lambda theta, phi, lam: (theta, phi, lam),
+    'u2': lambda phi, lam: (math.pi / 2, phi, lam),
+    'u1': lambda lam: (0, 0, lam),
+    'p': lambda lam: (0, 0, lam),
+    'rz': lambda lam: (0, 0, lam),
+    'rx': lambda theta: (theta, -math.pi / 2, math.pi / 2),
+    'ry': lambda theta: (theta, 0, 0)
+}
+# Libraries shipped with the simulator, searched after the include path
+LIBRARY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'qasm', 'include')
+# Definitions of every library loaded by the process, keyed by path and modification time
+_LIBRARIES: Dict[Tuple[str, float], 'QuantumCircuit'] = {}
+
+def quarter_turns(angle: float) -> Union[int, None]:
+    # Number of pi/2 turns in angle modulo 4, when it is a multiple of pi/2
+    turns = angle / (math.pi / 2)
+    k = round(turns)
+    return k % 4 if abs(turns - k) < 1e-9 else None
+
+def clifford_vop(theta: float, phi: float, lam: float) -> Union[int, None]:
+    # U(theta, phi, lambda) = Rz(phi) Ry(theta) Rz(lambda) up to a global phase. With
+    # every angle a multiple of pi/2 it is the local Clifford Rz(pi/2) = S, Ry(pi/2) = H Z
+    turns = [quarter_turns(angle) for angle in (lam, theta, phi)]
+    if None in turns:
+        return None
+    vop = 0
+    for k, word in zip(turns, [('s', ), ('z', 'h'), ('s', )]):
+        for gate in word * k:
+            vop = int(GraphStateSimulator.LOCAL_CLIFFORD_GROUP[GATE_VOPS[gate], vop])
+    return vop
+
+def u_matrix(theta: float, phi: float, lam: float) -> np.ndarray:
+    return np.array([
+        [math.cos(theta / 2), -np.exp(1.j * lam) * math.sin(theta / 2)],
+        [np.exp(1.j * phi) * math.sin(theta / 2), np.exp(1.j * (phi + lam)) * math.cos(theta / 2)]
+    ])
 
 class QuantumCircuit:
     def __init__(self, qreg: Union[QuantumRegister, List[QuantumRegister]], creg: Union[ClassicalRegister, List[ClassicalRegister]]) -> None:
@@ -29,8 +80,24 @@ class QuantumCircuit:
             self._creg[reg.name] = reg
             reg._offset = self._csize
             self._csize += reg.size
+        # Register holding every classical bit
+        self._bit_registers = [reg for reg in creg for _ in range(reg.size)]
         self.operations = []
-
+        # Fused body of every gate definition over the positions of its arguments
+        self._definitions: Dict[str, Tuple[int, List]] = {}
+        # Parameterized definitions, expanded once for every list of parameter values
+        self._deferred: Dict[str, Gate] = {}
+        self._expansions: Dict[Tuple, Tuple[int, List]] = {}
+        # Matrices of the rotations that are not Clifford, by gate name
+        self.unitaries: Dict[str, np.ndarray] = {}
+        self.include_path: List[str] = []
+        # Path and modification time of every file included, directly or not
+        self.includes: List[Tuple[str, float]] = []
+        # Path of the include file whose declarations this circuit holds, None for programs
+        self._library: Optional[str] = None
+        # NoiseModel of lib.noise applied by Executor.run, None for ideal runs
+        self.noise = None
+    
     def _get_qreg(self, name: str) -> QuantumRegister:
         return self._qreg[name]
     
@@ -44,15 +111,11 @@ class QuantumCircuit:
             if idx >= reg.size:
                 raise OutOfBoundsError(f'{reg.id} has not index {idx}')
             return  (reg._offset + idx, )
-        
+    
     def _set_bitval(self, idx: int, val: int) -> None:
-        for name in self._creg:
-            reg = self._creg[name]
-            if reg._offset <= idx < reg._offset + reg.size:
-                creg = reg
-                break
-        creg[idx - creg._offset].val = val
-
+        creg = self._bit_registers[idx]
+        creg.set_bit(idx - creg._offset, val)
+    
     def _apply_operation(self, type: CircuitOp, name: str, *args) -> None:
         self.operations.append((type, name, *args))
     
@@ -94,7 +157,7 @@ class QuantumCircuit:
     
     def CY(self, control: int, target: int) -> None:
         self._apply('cy', control, target)
-
+    
     def CZ(self, control: int, target: int) -> None:
         self._apply('cz', control, target)
     
@@ -111,11 +174,162 @@ class QuantumCircuit:
             for a, b in zip(qidx, cidx):
                 self._apply_measurement(a, b)
     
+    def _define(self, gate: Gate) -> None:
+        # Native gates keep their implementation over library definitions. The rotations of
+        # the shipped library are the ones ROTATION_GATES lowers directly, any other
+        # definition of a rotation replaces the direct lowering.
+        if self._library is not None and (gate.name in NATIVE_GATES or (gate.name in ROTATION_GATES and os.path.dirname(self._library) == LIBRARY_DIR)):
+            return
+        if gate.name in self._definitions or gate.name in self._deferred:
+            raise GateError(f'gate {gate.name} is already defined')
+        if len(gate.params) > 0:
+            self._deferred[gate.name] = gate
+        else:
+            self._definitions[gate.name] = self._compile(gate, ())
+    
+    def _compile(self, gate: Gate, values: Tuple[float, ...]) -> Tuple[int, List]:
+        # Imported here because the optimizer works on the operations of this module
+        from .optimizer import fuse
+        
+        if len(values) != len(gate.params):
+            raise GateError(f'gate {gate.name} expects {len(gate.params)} parameters, got {len(values)}')
+        env = dict(zip(gate.params, values))
+        formal = {arg: i for i, arg in enumerate(gate.args)}
+        body = []
+        for ins in gate.body:
+            positions = []
+            for reg in ins.args:
+                if reg.id not in formal or reg.idx != -1:
+                    raise GateError(f'gate {gate.name} has no argument {reg}')
+                positions.append(formal[reg.id])
+            body.extend(self._call(ins.name, self._evaluate(ins, env), tuple(positions)))
+        return len(gate.args), fuse(body)
+    
+    @staticmethod
+    def _evaluate(ins: ApplyGate, env: Optional[Dict[str, float]] = None) -> Tuple[float, ...]:
+        try:
+            return tuple(param.evaluate(env) for param in ins.params)
+        except (NameError, ArithmeticError, ValueError) as e:
+            raise GateError(f'gate {ins.name}: {e}')
+    
+    def _rotation(self, name: str, values: Tuple[float, ...], qubit: int) -> Tuple:
+        try:
+            theta, phi, lam = ROTATION_GATES[name](*values)
+        except TypeError:
+            raise GateError(f'gate {name} does not take {len(values)} parameters')
+        
+        vop = clifford_vop(theta, phi, lam)
+        if vop is not None:
+            return (CircuitOp.APPLY, VOP_NAMES.get(vop, vop_gate(vop)), qubit)
+        gate = f'U({theta:.17g},{phi:.17g},{lam:.17g})'
+        if gate not in self.unitaries:
+            self.unitaries[gate] = u_matrix(theta, phi, lam)
+        return (CircuitOp.APPLY, gate, qubit)
+    
+    def _call(self, name: str, values: Tuple[float, ...], qubits: Tuple[int, ...]) -> Iterator[Tuple]:
+        name = BUILTIN_GATES.get(name, name)
+        if name in self._definitions or name in self._deferred:
+            yield from self._instantiate(name, values, qubits)
+        elif name in ROTATION_GATES:
+            if len(qubits) != 1:
+                raise GateError(f'gate {name} expects 1 argument, got {len(qubits)}')
+            yield self._rotation(name, values, qubits[0])
+        elif len(values) > 0:
+            raise GateError(f'gate {name} takes no parameters')
+        else:
+            yield (CircuitOp.APPLY, name, *qubits)
+    
+    def _find_include(self, filename: str) -> str:
+        for directory in [*self.include_path, LIBRARY_DIR]:
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path):
+                return os.path.abspath(path)
+        raise IncludeError(f'include file {filename} not found')
+    
+    @staticmethod
+    def load_library(path: str) -> 'QuantumCircuit':
+        # Parses and lowers the declarations of an include file once per process
+        key = (path, os.path.getmtime(path))
+        library = _LIBRARIES.get(key)
+        if library is None:
+            library = QuantumCircuit([], [])
+            library._library = path
+            library.include_path = [os.path.dirname(path)]
+            with open(path, 'r') as f:
+                for ins in Parser(Tokenizer(f)).parse_library():
+                    library._declare(ins)
+            _LIBRARIES[key] = library
+        return library
+    
+    def _include(self, filename: str) -> None:
+        path = self._find_include(filename)
+        library = QuantumCircuit.load_library(path)
+        self.includes.append((path, os.path.getmtime(path)))
+        self.includes.extend(library.includes)
+        for table in ['_definitions', '_deferred']:
+            for name, definition in getattr(library, table).items():
+                if name in self._definitions or name in self._deferred:
+                    raise GateError(f'gate {name} is already defined')
+                getattr(self, table)[name] = definition
+        self.unitaries.update(library.unitaries)
+    
+    def _declare(self, ins: QInstruction) -> None:
+        if isinstance(ins, Gate):
+            self._define(ins)
+        elif isinstance(ins, Include):
+            self._include(ins.filename)
+        elif not isinstance(ins, Opaque):
+            raise NotImplementedError(f'{ins} is not a declaration')
+    
+    def _instantiate(self, name: str, values: Tuple[float, ...], qubits) -> Iterator[Tuple]:
+        if name in self._definitions:
+            if len(values) > 0:
+                raise GateError(f'gate {name} takes no parameters')
+            arity, template = self._definitions[name]
+        else:
+            key = (name, values)
+            if key not in self._expansions:
+                self._expansions[key] = self._compile(self._deferred[name], values)
+            arity, template = self._expansions[key]
+        if len(qubits) != arity:
+            raise GateError(f'gate {name} expects {arity} arguments, got {len(qubits)}')
+        for op, gate, *args in template:
+            yield (op, gate, *(qubits[i] for i in args))
+    
+    def _lower(self, ins: QInstruction) -> Iterator[Tuple]:
+        if isinstance(ins, ApplyGate):
+            idxs = []
+            for reg in ins.args:
+                idxs.append(self._resolve_reg(self._get_qreg(reg.id), reg.idx))
+            values = self._evaluate(ins)
+            for x in product(*idxs):
+                yield from self._call(ins.name, values, x)
+        elif isinstance(ins, (Gate, Include, Opaque)):
+            self._declare(ins)
+        elif isinstance(ins, Measure):
+            qidx = self._resolve_reg(self._get_qreg(ins.qreg.id), ins.qreg.idx)
+            cidx = self._resolve_reg(self._get_creg(ins.creg.id), ins.creg.idx)
+            
+            if len(qidx) != len(cidx):
+                raise MeasureError('invalid register for measure operation')
+            for a, b in zip(qidx, cidx):
+                yield (CircuitOp.MEASURE, 'measure', a, b)
+        elif isinstance(ins, Reset):
+            for qubit in self._resolve_reg(self._get_qreg(ins.qreg.id), ins.qreg.idx):
+                yield (CircuitOp.RESET, 'reset', qubit)
+        elif isinstance(ins, If):
+            if not isinstance(ins.body, ApplyGate):
+                raise NotImplementedError('only gates can be applied conditionally')
+            if_apply = list(self._lower(ins.body))
+            yield (CircuitOp.IF, 'if', ins.val, self._get_creg(ins.creg), if_apply)
+        else:
+            raise NotImplementedError('unimplemented operation for QuantumCircuit')
+    
     @staticmethod
-    def from_qasm(qasm: QasmProgram):
+    def from_qasm(qasm: QasmProgram, include_path: Sequence[str] = ()):
         qreg = []
         creg = []
-
+        
         instructions = []
         for ins in qasm.prog:
             if isinstance(ins, QReg):
@@ -125,35 +339,44 @@ class QuantumCircuit:
             else:
                 instructions.append(ins)
         circ = QuantumCircuit(qreg, creg)
-
-        def resolve_apply(ins: ApplyGate):
-            idxs = []
-            for reg in ins.args:
-                idxs.append(circ._resolve_reg(circ._get_qreg(reg.id), reg.idx))
-            for x in product(*idxs):
-                circ._apply(ins.name, *x)
-
+        circ.include_path = list(include_path)
+        
+        for ins in instructions:
+            circ.operations.extend(circ._lower(ins))
+        
+        return circ
+    
+    @staticmethod
+    def stream_qasm(instructions: Iterator[QInstruction], include_path: Sequence[str] = ()):
+        # Reads the register declarations up to the first operation and returns the
+        # circuit together with a lazy stream of its operations
+        instructions = iter(instructions)
+        qreg = []
+        creg = []
+        
+        declarations = []
+        first = None
         for ins in instructions:
-            if isinstance(ins, ApplyGate):
-                resolve_apply(ins)
-            elif isinstance(ins, Measure):
-                qidx = circ._resolve_reg(circ._get_qreg(ins.qreg.id), ins.qreg.idx)
-                cidx = circ._resolve_reg(circ._get_creg(ins.creg.id), ins.creg.idx)
-                
-                if len(qidx) != len(cidx):
-                    raise MeasureError('invalid register for measure operation')
-                for a, b in zip(qidx, cidx):
-                    circ._apply_measurement(a, b)
-            elif isinstance(ins, If):
-                body = ins.body
-                idxs = []
-                for reg in body.args:
-                    idxs.append(circ._resolve_reg(circ._get_qreg(reg.id), reg.idx))
-                if_apply = []
-                for x in product(*idxs):
-                    if_apply.append((CircuitOp.APPLY, body.name, *x))
-                circ._apply_if(ins.val, circ._get_creg(ins.creg), if_apply)
+            if isinstance(ins, QReg):
+                qreg.append(QuantumRegister(ins.size, ins.id))
+            elif isinstance(ins, CReg):
+                creg.append(ClassicalRegister(ins.size, ins.id))
+            elif isinstance(ins, (Gate, Include, Opaque)):
+                declarations.append(ins)
             else:
-                raise NotImplementedError('unimplemented operation for QuantumCircuit')
+                first = ins
+                break
+        circ = QuantumCircuit(qreg, creg)
+        circ.include_path = list(include_path)
+        for ins in declarations:
+            circ._declare(ins)
+        
+        def operations():
+            if first is not None:
+                yield from circ._lower(first)
+            for ins in instructions:
+                if isinstance(ins, (QReg, CReg)):
+                    raise RegisterError(f'register {ins.id} must be declared before the first operation when streaming')
+                yield from circ._lower(ins)
         
-        return circ
\ No newline at end of file
+        return circ, operations()
@@ -0,0 +1,209 @@
+import numpy as np
+from itertools import islice
+from typing import List, Tuple
+from .circuit import QuantumCircuit, CircuitOp
+
+APPLY = CircuitOp.APPLY.value
+MEASURE = CircuitOp.MEASURE.value
+IF = CircuitOp.IF.value
+RESET = CircuitOp.RESET.value
+
+class CompiledCircuit:
+    # Flat form of QuantumCircuit.operations. Every gate, measurement or reset is one row of
+    # the parallel arrays kind, gate, q0, q1, cbit and cond, unused operands hold -1.
+    # Gates of an IF body become rows of kind IF that share the id of their condition.
+    def __init__(self, circ: QuantumCircuit, relabel: bool = True) -> None:
+        self._registers(circ)
+        gates = {}
+        regs = list(circ._creg)
+        conditions = []
+        rows = []
+        # Index in circ.operations of the operation every row comes from
+        self.origin: List[int] = []
+        for index, (op, name, *args) in enumerate(circ.operations):
+            if op == CircuitOp.MEASURE:
+                rows.append((MEASURE, -1, args[0], -1, args[1], -1))
+            elif op == CircuitOp.RESET:
+                rows.append((RESET, -1, args[0], -1, -1, -1))
+            elif op == CircuitOp.APPLY:
+                qubits = (*args, -1, -1)
+                rows.append((APPLY, gates.setdefault(name, len(gates)), qubits[0], qubits[1], -1, -1))
+            elif op == CircuitOp.IF:
+                cond = len(conditions)
+                conditions.append((args[0], regs.index(args[1].name)))
+                for _, gate, *qubits in args[2]:
+                    qubits = (*qubits, -1, -1)
+                    rows.append((IF, gates.setdefault(gate, len(gates)), qubits[0], qubits[1], -1, cond))
+            else:
+                raise NotImplementedError(f'{op} operations can not be compiled')
+            self.origin.extend([index] * (len(rows) - len(self.origin)))
+        
+        rows = np.array(rows, dtype=np.int64).reshape(-1, 6)
+        self.gates: List[str] = list(gates)
+        self.conditions = np.array(conditions, dtype=np.int64).reshape(-1, 2)
+        self.kind = rows[:, 0].astype(np.uint8)
+        self.gate = rows[:, 1].astype(np.int32)
+        self.q0 = rows[:, 2]
+        self.q1 = rows[:, 3]
+        self.cbit = rows[:, 4]
+        self.cond = rows[:, 5]
+        self.layout = list(range(self.nqubits))
+        if relabel:
+            self._relabel()
+        self._build()
+    
+    @staticmethod
+    def from_arrays(circ: QuantumCircuit, gates: List[str], conditions: np.ndarray, origin: np.ndarray, kind: np.ndarray, gate: np.ndarray, q0: np.ndarray, q1: np.ndarray, cbit: np.ndarray, cond: np.ndarray) -> 'CompiledCircuit':
+        # Circuit compiled without relabeling from the arrays of an earlier compilation, the
+        # registers of circ give the classical layout and its operations are not read
+        compiled = CompiledCircuit.__new__(CompiledCircuit)
+        compiled._registers(circ)
+        compiled.gates = gates
+        compiled.conditions = conditions.astype(np.int64).reshape(-1, 2)
+        compiled.origin = origin.tolist()
+        compiled.kind = kind.astype(np.uint8)
+        compiled.gate = gate.astype(np.int32)
+        compiled.q0, compiled.q1, compiled.cbit, compiled.cond = (column.astype(np.int64) for column in (q0, q1, cbit, cond))
+        compiled.layout = list(range(compiled.nqubits))
+        compiled._build()
+        return compiled
+    
+    def relabeled(self) -> 'CompiledCircuit':
+        # Copy of a circuit compiled without relabeling, with its swaps relabeled
+        if 'swap' not in self.gates:
+            return self
+        compiled = CompiledCircuit.__new__(CompiledCircuit)
+        compiled.__dict__.update(self.__dict__)
+        compiled._relabel()
+        compiled._build()
+        return compiled
+    
+    def _registers(self, circ: QuantumCircuit) -> None:
+        self.nqubits = circ._qsize
+        self.nbits = circ._csize
+        self.registers = [(reg._offset, reg.size) for reg in circ._creg.values()]
+    
+    def _relabel(self) -> None:
+        # An unconditional swap only exchanges which physical qubits hold two logical qubits,
+        # so its row is folded into a logical-to-physical layout and the rows after it are
+        # rewritten through that layout. Swaps inside an IF body still run on the backend.
+        if 'swap' not in self.gates:
+            return
+        swap = self.gates.index('swap')
+        layout = list(self.layout)
+        kind, gate, q0, q1 = (column.tolist() for column in (self.kind, self.gate, self.q0, self.q1))
+        rows = []
+        for row in range(len(kind)):
+            a, b = q0[row], q1[row]
+            if kind[row] == APPLY and gate[row] == swap:
+                assert a != b, 'swap qubits must be different'
+                layout[a], layout[b] = layout[b], layout[a]
+                continue
+            q0[row] = layout[a]
+            q1[row] = -1 if b == -1 else layout[b]
+            rows.append(row)
+        
+        # Gates are numbered again in order of first use, as if the swaps were never written
+        gates = {}
+        for row in rows:
+            if gate[row] != -1:
+                gate[row] = gates.setdefault(gate[row], len(gates))
+        self.gates = [self.gates[index] for index in gates]
+        self.kind = self.kind[rows]
+        self.gate = np.array([gate[row] for row in rows], dtype=np.int32)
+        self.q0 = np.array([q0[row] for row in rows], dtype=np.int64)
+        self.q1 = np.array([q1[row] for row in rows], dtype=np.int64)
+        self.cbit = self.cbit[rows]
+        self.cond = self.cond[rows]
+        self.origin = [self.origin[row] for row in rows]
+        self.layout = layout
+    
+    def _build(self) -> None:
+        self._program = None
+        # Expected bits of every condition, as ASCII digits with bit 0 first, so a test
+        # is one comparison against a slice of the classical bits
+        self.condition_bits = []
+        for val, reg in self.conditions.tolist():
+            offset, size = self.registers[reg]
+            expected = format(val, f'0{size}b')[::-1].encode() if val < (1 << size) else None
+            self.condition_bits.append((offset, offset + size, expected))
+    
+    @property
+    def program(self) -> List:
+        # Python view of the arrays for the interpreter loop, built once on first use
+        if self._program is None:
+            self._program = []
+            for kind, gate, q0, q1, cbit, cond in zip(self.kind.tolist(), self.gate.tolist(), self.q0.tolist(), self.q1.tolist(), self.cbit.tolist(), self.cond.tolist()):
+                qubits = (q0, ) if q1 == -1 else (q0, q1)
+                self._program.append((kind, gate, qubits, cbit, cond))
+        return self._program
+    
+    def dispatch(self, sim) -> List:
+        # Bound gate methods of the simulator indexed by the gate column
+        try:
+            return [sim.gates[name] for name in self.gates]
+        except KeyError as e:
+            raise NotImplementedError(f'Gate {e.args[0]} it is not implemented in {sim.__class__.__name__}')
+    
+    def execute(self, sim) -> str:
+        # Highest classical bit first, as the registers concatenated by Executor._result
+        return self.bits(sim)[::-1].decode()
+    
+    def prefix(self) -> int:
+        # Number of leading rows that draw no random outcome, every shot reaches the same
+        # state after them. Conditions in these rows only see classical bits still at 0.
+        rows = np.flatnonzero((self.kind == MEASURE) | (self.kind == RESET))
+        return int(rows[0]) if len(rows) else len(self.kind)
+    
+    def bits(self, sim, start: int = 0, stop: int = None) -> bytearray:
+        # Classical bits after one shot as ASCII digits, bit 0 first, from the rows start to
+        # stop on a simulator that already ran the rows before start
+        funcs = self.dispatch(sim)
+        measure = sim.measure
+        reset = sim.reset
+        conditions = self.condition_bits
+        bits = bytearray(b'0' * self.nbits)
+        
+        for kind, gate, qubits, cbit, cond in islice(self.program, start, stop):
+            if kind == APPLY:
+                funcs[gate](*qubits)
+            elif kind == MEASURE:
+                bits[cbit] = 49 if measure(qubits[0]) else 48
+            elif kind == RESET:
+                reset(qubits[0])
+            else:
+                lo, hi, expected = conditions[cond]
+                if bits[lo:hi] == expected:
+                    funcs[gate](*qubits)
+        return bits
+    
+    def arrays(self) -> Tuple[np.ndarray, ...]:
+        return self.kind, self.gate, self.q0, self.q1, self.cbit, self.cond
+    
+    def operations(self, circ: QuantumCircuit) -> List:
+        # Operations of QuantumCircuit written back from the rows, with the registers of circ
+        cregs = list(circ._creg.values())
+        kinds = {op.value: op for op in CircuitOp}
+        operations = []
+        last_cond = -1
+        for kind, gate, qubits, cbit, cond in self.program:
+            op = kinds[kind]
+            if op == CircuitOp.MEASURE:
+                operations.append((op, 'measure', qubits[0], cbit))
+                continue
+            if op == CircuitOp.RESET:
+                operations.append((op, 'reset', qubits[0]))
+                continue
+            
+            instruction = (CircuitOp.APPLY, self.gates[gate], *qubits)
+            if op == CircuitOp.APPLY:
+                operations.append(instruction)
+                last_cond = -1
+                continue
+            if cond == last_cond:
+                operations[-1][4].append(instruction)
+            else:
+                val, reg = self.conditions[cond].tolist()
+                operations.append((CircuitOp.IF, 'if', val, cregs[reg], [instruction]))
+                last_cond = cond
+        return operations
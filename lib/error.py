@@ -5,4 +5,8 @@ class RegisterError(CircuitError):
 class OutOfBoundsError(RegisterError, IndexError):
     pass
 class MeasureError(CircuitError):
+    pass
+class GateError(CircuitError):
+    pass
+class IncludeError(CircuitError):
     pass
\ No newline at end of file
@@ -1,31 +1,280 @@
+import asyncio
+import random
+import numpy as np
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, List, Tuple, Union
 from qasm.parser import *
 from lib.circuit import QuantumCircuit, CircuitOp
+from lib.compiled import CompiledCircuit, APPLY, MEASURE, IF, RESET
+from lib.frame import PauliFrameSampler
+from lib.lockstep import lockstep_bits
+from lib.noise import NoiseLocations
+from lib.result import ClassicalState, Shots
+from simulators.compact import CompactGraphStateSimulator
+from simulators.statevector import StatevectorSimulator
+from simulators.tableau import TableauSimulator
 
-class Executor:
-    def __init__(self, circuit: QuantumCircuit) -> None:
-        self.circ = circuit
+def generators(seed: np.random.SeedSequence) -> Tuple[np.random.Generator, random.Random]:
+    # Independent numpy and Python generators for the batched draws and the backends
+    numpy_seed, python_seed = seed.spawn(2)
+    return np.random.default_rng(numpy_seed), random.Random(int.from_bytes(python_seed.generate_state(4).tobytes(), 'little'))
+
+class ShotRunner:
+    # Everything needed to run shots of a compiled circuit, sent once to every worker.
+    # With a reference shot the shots are sampled from Pauli frames, and lockstep backends
+    # run all the shots of a chunk together.
+    def __init__(self, compiled: CompiledCircuit, backend, unitaries: Dict, noise: NoiseLocations = None, reference: List[int] = None) -> None:
+        self.compiled = compiled
+        self.backend = backend
+        self.unitaries = {name: unitaries[name] for name in compiled.gates if name in unitaries}
+        self.noise = noise
+        self.reference = reference
+        # Rows before the first measurement, reset or error location run once, on a
+        # snapshot that every shot copies
+        self.prefix = compiled.prefix()
+        if noise is not None and len(noise):
+            self.prefix = min(self.prefix, int(noise.rows.min()))
+        self.snapshot = None
     
-    def run(self, backend, shots: int = 1000) -> Counter:
-        assert shots > 1, 'you must execute almost one run'
+    def create(self, source: random.Random, shots: int = 1):
+        if self.backend.LOCKSTEP:
+            sim = self.backend(self.compiled.nqubits, shots)
+        else:
+            sim = self.backend(self.compiled.nqubits)
+        for name, matrix in self.unitaries.items():
+            if name not in sim.gates:
+                sim.add_unitary(name, matrix)
+        sim.random = source
+        return sim
+    
+    def fork(self, source: random.Random):
+        # New shot in the state after the prefix, which is simulated on the first call
+        if self.snapshot is None:
+            self.snapshot = self.create(source)
+            self.compiled.bits(self.snapshot, stop=self.prefix)
+        sim = self.snapshot.copy()
+        sim.random = source
+        return sim
+    
+    def run(self, seed: np.random.SeedSequence, shots: int) -> np.ndarray:
+        # Packed classical bits of the shots of one chunk
+        rng, source = generators(seed)
+        if self.reference is not None:
+            sampler = PauliFrameSampler(self.compiled, rng, self.noise)
+            return PauliFrameSampler.shots(sampler.frames(self.reference, shots), shots).packed
+        if self.backend.LOCKSTEP:
+            events = None if self.noise is None else self.noise.batch(shots, rng)
+            return np.packbits(lockstep_bits(self.compiled, self.create(source, shots), events), axis=1, bitorder='little')
         result = []
         for _ in range(shots):
-            sim = backend(self.circ._qsize)
+            sim = self.fork(source)
+            if self.noise is None:
+                result.append(self.compiled.bits(sim, self.prefix))
+            else:
+                result.append(self.noise.bits(self.compiled, sim, rng, self.prefix))
+        return Shots.from_ascii(b''.join(result), shots, self.compiled.nbits).packed
+
+# Runner of the worker process, set once by the pool initializer
+_runner: ShotRunner = None
+
+def _initialize(runner: ShotRunner) -> None:
+    global _runner
+    _runner = runner
 
-            for op, name, *args in self.circ.operations:
-                if op == CircuitOp.APPLY:
+def _run_chunk(seed: np.random.SeedSequence, shots: int) -> np.ndarray:
+    return _runner.run(seed, shots)
+
+class Executor:
+    # Limits used by the automatic backend selection
+    MAX_STATEVECTOR_QUBITS = 28
+    SMALL_CIRCUIT_QUBITS = 12
+    MAX_TABLEAU_QUBITS = 20000
+    DENSE_INTERACTION_DEGREE = 6.0
+    # Shots of every chunk with its own random streams, fixed so that a seed gives the
+    # same shots for any number of workers
+    CHUNK_SHOTS = 256
+    FRAME_CHUNK_SHOTS = 1 << 16
+    LOCKSTEP_CHUNK_SHOTS = 1024
+    
+    def __init__(self, circuit: QuantumCircuit, compiled: CompiledCircuit = None) -> None:
+        self.circ = circuit
+        # Compiled once for each value of relabel and shared by every run, which only reads
+        # it, so the circuit must not change after the first run. A circuit loaded from
+        # CircuitCache comes compiled without relabeling and its operations are not read.
+        self._compiled: Dict[bool, CompiledCircuit] = {} if compiled is None else {False: compiled}
+    
+    def compiled(self, relabel: bool = True) -> CompiledCircuit:
+        if relabel not in self._compiled:
+            if relabel:
+                self._compiled[True] = self.compiled(relabel=False).relabeled()
+            else:
+                self._compiled[False] = CompiledCircuit(self.circ, relabel=False)
+        return self._compiled[relabel]
+    
+    def profile(self) -> Dict:
+        compiled = self.compiled(relabel=False)
+        gates = {compiled.gates[gate] for gate in np.unique(compiled.gate[compiled.gate != -1]).tolist()}
+        two_qubit = compiled.q1 != -1
+        pairs = np.unique(np.sort(np.stack([compiled.q0[two_qubit], compiled.q1[two_qubit]], axis=1), axis=1), axis=0)
+        # Gates after the first measurement or reset
+        measured = np.flatnonzero(np.isin(compiled.kind, (MEASURE, RESET)))
+        mid_circuit_measurements = bool(len(measured) and np.isin(compiled.kind[measured[0]:], (APPLY, IF)).any())
+        
+        return {
+            'gates': gates,
+            'qubits': self.circ._qsize,
+            # Average number of distinct partners each qubit interacts with
+            'interaction_degree': 2 * len(pairs) / self.circ._qsize,
+            'mid_circuit_measurements': mid_circuit_measurements
+        }
+    
+    def select_backend(self) -> Tuple[type, str]:
+        profile = self.profile()
+        gates, nqubits = profile['gates'], profile['qubits']
+        
+        non_clifford = gates - set(TableauSimulator(1).gates)
+        if non_clifford:
+            unsupported = gates - set(StatevectorSimulator(1).gates) - set(self.circ.unitaries)
+            if unsupported:
+                raise NotImplementedError(f'no backend implements gates {", ".join(sorted(unsupported))}')
+            if nqubits > Executor.MAX_STATEVECTOR_QUBITS:
+                raise NotImplementedError(f'non-Clifford gates {", ".join(sorted(non_clifford))} on {nqubits} qubits exceed the statevector limit of {Executor.MAX_STATEVECTOR_QUBITS}')
+            return StatevectorSimulator, f'non-Clifford gates {", ".join(sorted(non_clifford))} need the statevector backend'
+        
+        if nqubits <= Executor.SMALL_CIRCUIT_QUBITS and not profile['mid_circuit_measurements']:
+            return StatevectorSimulator, f'small Clifford circuit ({nqubits} qubits) with terminal measurements is sampled from a single statevector'
+        degree = profile['interaction_degree']
+        if degree >= Executor.DENSE_INTERACTION_DEGREE and nqubits <= Executor.MAX_TABLEAU_QUBITS:
+            return TableauSimulator, f'dense Clifford circuit (interaction degree {degree:.1f}) is cheaper on the stabilizer tableau'
+        return CompactGraphStateSimulator, f'sparse Clifford circuit (interaction degree {degree:.1f}, {nqubits} qubits) fits the graph state backend'
+    
+    def _terminal_measurements(self) -> Union[List[Tuple[int, int]], None]:
+        # (qubit, bit) pairs of the circuit when no gate or condition follows a measurement
+        compiled = self.compiled(relabel=False)
+        if np.isin(compiled.kind, (IF, RESET)).any():
+            return None
+        measured = compiled.kind == MEASURE
+        # Without any measurement, argmax has nothing to look at and every bit stays 0
+        if not measured.any():
+            return []
+        first = int(measured.argmax())
+        if not measured[first:].all():
+            return None
+        return list(zip(compiled.q0[measured].tolist(), compiled.cbit[measured].tolist()))
+    
+    def _create(self, backend, gates=()):
+        # Registers the matrices of the rotations among gates on a new simulator
+        sim = backend(self.circ._qsize)
+        for name in gates:
+            if name in self.circ.unitaries and name not in sim.gates:
+                sim.add_unitary(name, self.circ.unitaries[name])
+        return sim
+    
+    def _sample(self, backend, shots: int, measures: List[Tuple[int, int]], seed: np.random.SeedSequence) -> Shots:
+        compiled = self.compiled()
+        rng, source = generators(seed)
+        sim = self._create(backend, compiled.gates)
+        sim.random = source
+        funcs = compiled.dispatch(sim)
+        for kind, gate, qubits, _, _ in compiled.program:
+            if kind == APPLY:
+                funcs[gate](*qubits)
+        
+        measures = [(compiled.layout[qubit], bit) for qubit, bit in measures]
+        qubits = list(dict.fromkeys(qubit for qubit, _ in measures))
+        rows = []
+        counts = []
+        for outcome, count in sim.sample(qubits, shots).items():
+            values = dict(zip(qubits, outcome))
+            bits = np.zeros(self.circ._csize, dtype=np.uint8)
+            for qubit, bit in measures:
+                bits[bit] = values[qubit]
+            rows.append(np.packbits(bits, bitorder='little'))
+            counts.append(count)
+        # Shots of the same outcome are drawn together, the order of the rows is random
+        packed = np.repeat(np.array(rows, dtype=np.uint8).reshape(len(rows), -1), counts, axis=0)
+        return Shots(rng.permutation(packed), self.circ._csize)
+    
+    def _execute(self, sim, state: ClassicalState, op: CircuitOp, name: str, *args) -> None:
+        if op == CircuitOp.APPLY:
+            sim.apply_gate(name, *args)
+        elif op == CircuitOp.MEASURE:
+            state.set(args[1], sim.measure(args[0]))
+        elif op == CircuitOp.RESET:
+            sim.reset(args[0])
+        elif op == CircuitOp.IF:
+            bval = state.value(args[1]._offset, args[1].size)
+            if args[0] == bval:
+                for op, name, *args in args[2]:
                     sim.apply_gate(name, *args)
-                elif op == CircuitOp.MEASURE:
-                    b = sim.measure(args[0])
-                    self.circ._set_bitval(args[1], b)
-                elif op == CircuitOp.IF:
-                    bval = args[1].to_int()
-                    if args[0] == bval:
-                        for op, name, *args in args[2]:
-                            sim.apply_gate(name, *args)
-            res = ''
-            for name in self.circ._creg:
-                res = self.circ._creg[name].to_binary_string() + res
-            result.append(res)
+    
+    def run(self, backend, shots: int = 1000, frames: bool = True, packed: bool = False, workers: int = 1, seed: int = None) -> Union[Counter, Shots]:
+        # Counts of every outcome, or the packed classical bits of every shot with packed
+        result = self._shots(backend, shots, frames, workers, seed)
+        return result if packed else result.counts()
+    
+    async def run_async(self, backend, shots: int = 1000, frames: bool = True, packed: bool = False, workers: int = 1, seed: int = None, pool=None) -> Union[Counter, Shots]:
+        # run on the thread pool of the event loop, or on pool, without blocking the loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, partial(self.run, backend, shots, frames, packed, workers, seed))
+    
+    def _shots(self, backend, shots: int, frames: bool, workers: int, seed: int) -> Shots:
+        assert shots > 1, 'you must execute almost one run'
+        assert workers > 0, 'you must use almost one worker'
+        reference_seed, chunks_seed = np.random.SeedSequence(seed).spawn(2)
+        noise = self.circ.noise
+        measures = self._terminal_measurements()
+        if measures is not None and backend.SUPPORTS_SAMPLING and noise is None:
+            return self._sample(backend, shots, measures, reference_seed)
+        
+        # Noise of single operations refers to circ.operations, so swaps stay in place
+        compiled = self.compiled(relabel=noise is None)
+        locations = None if noise is None else noise.locations(compiled)
+        runner = ShotRunner(compiled, backend, self.circ.unitaries, locations)
+        chunk = Executor.CHUNK_SHOTS
+        first = None
+        # Lockstep backends run every shot themselves
+        if backend.LOCKSTEP:
+            chunk = Executor.LOCKSTEP_CHUNK_SHOTS
+        # Clifford circuits only need one shot on the backend, the others follow from Pauli frames
+        elif frames and PauliFrameSampler.supports(compiled):
+            sim = runner.create(generators(reference_seed)[1])
+            sampler = PauliFrameSampler(compiled)
+            runner.reference = sampler.reference(sim)
+            first = sampler.outcome(runner.reference)
+            chunk = Executor.FRAME_CHUNK_SHOTS
+        elif noise is None:
+            sim = runner.fork(generators(reference_seed)[1])
+            first = compiled.bits(sim, runner.prefix)
+        # Without noise, a first shot that drew no random outcome gives the outcome of every shot
+        if first is not None and noise is None and sim.random_draws == 0:
+            return Shots.repeat(first, shots, compiled.nbits)
+        
+        sizes = [min(chunk, shots - start) for start in range(0, shots, chunk)]
+        seeds = chunks_seed.spawn(len(sizes))
+        if workers == 1 or len(sizes) == 1:
+            parts = [runner.run(seed, size) for seed, size in zip(seeds, sizes)]
+        else:
+            with ProcessPoolExecutor(min(workers, len(sizes)), initializer=_initialize, initargs=(runner, )) as pool:
+                parts = list(pool.map(_run_chunk, seeds, sizes))
+        return Shots(np.concatenate(parts), compiled.nbits)
+    
+    def run_stream(self, backend, operations: Iterable, seed: int = None) -> Counter:
+        # Executes a single shot while the operations are still being parsed, so the
+        # program never has to be held in memory
+        sim = self._create(backend)
+        sim.random = generators(np.random.SeedSequence(seed))[1]
+        state = ClassicalState(self.circ._csize)
+        for op, name, *args in operations:
+            # Rotations are only known once the stream reaches them
+            if op == CircuitOp.APPLY and name in self.circ.unitaries and name not in sim.gates:
+                sim.add_unitary(name, self.circ.unitaries[name])
+            elif op == CircuitOp.IF:
+                for _, gate, *_ in args[2]:
+                    if gate in self.circ.unitaries and gate not in sim.gates:
+                        sim.add_unitary(gate, self.circ.unitaries[gate])
+            self._execute(sim, state, op, name, *args)
         
-        return Counter(result)
\ No newline at end of file
+        return Counter([state.result()])
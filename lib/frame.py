@@ -0,0 +1,213 @@
+import sys
+import numpy as np
+from typing import List, Tuple, Union
+from .compiled import CompiledCircuit, APPLY, MEASURE, IF, RESET
+from .noise import NoiseLocations
+from .result import Shots
+
+sys.path.append('..')
+from simulators.clifford import GATE_VOPS, VOP_WORDS
+
+# Action of the local Clifford group on the (x, z) bits of a Pauli frame, as the rows
+# (x from x, x from z) and (z from x, z from z) of a matrix over GF(2)
+WORD_FRAMES = {'h': ((0, 1), (1, 0)), 's': ((1, 0), (1, 1)), 'sdg': ((1, 0), (1, 1))}
+IDENTITY_FRAME = ((1, 0), (0, 1))
+# (x, z) bits of the Pauli applied by the first four elements of the group
+PAULI_FRAMES = {0: (0, 0), 1: (1, 0), 2: (1, 1), 3: (0, 1)}
+TWO_QUBIT_GATES = {'cx', 'cy', 'cz', 'swap'}
+
+def _frame_map(word) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    (a, b), (c, d) = IDENTITY_FRAME
+    for gate in word:
+        (e, f), (g, h) = WORD_FRAMES.get(gate, IDENTITY_FRAME)
+        (a, b), (c, d) = ((e & a) ^ (f & c), (e & b) ^ (f & d)), ((g & a) ^ (h & c), (g & b) ^ (h & d))
+    return (a, b), (c, d)
+
+VOP_FRAMES = [_frame_map(word) for word in VOP_WORDS]
+
+def gate_vop(name: str) -> Union[int, None]:
+    # Element of the local Clifford group applied by a single-qubit gate
+    if name in GATE_VOPS:
+        return GATE_VOPS[name]
+    if name.startswith('vop') and name[3:].isdigit() and int(name[3:]) < len(VOP_FRAMES):
+        return int(name[3:])
+    return None
+
+class PauliFrameSampler:
+    # Samples many shots of a Clifford circuit from a single reference shot. Every shot
+    # differs from the reference by a Pauli frame, which Clifford gates only permute, so
+    # the frames of all shots are propagated together as bit rows with one bit per shot.
+    # Random Z components are added to the frame at the start and after every collapse,
+    # they leave the state unchanged and turn into the random measurement outcomes.
+    WORD = 64
+    ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+    # Shots whose outcomes are transposed at once when counting
+    CHUNK_SHOTS = 1 << 16
+    
+    def __init__(self, compiled: CompiledCircuit, rng: np.random.Generator = None, noise: NoiseLocations = None) -> None:
+        assert PauliFrameSampler.supports(compiled), 'circuit has operations that do not act on Pauli frames'
+        self.compiled = compiled
+        self.rng = np.random.default_rng() if rng is None else rng
+        # Errors are Paulis as well, so they are added to the frames of the shots they hit
+        self.noise = noise
+    
+    @staticmethod
+    def supports(compiled: CompiledCircuit) -> bool:
+        # Clifford gates only, and only Pauli gates under a condition
+        for kind, gate, qubits, _, _ in compiled.program:
+            name = compiled.gates[gate] if kind in (APPLY, IF) else None
+            if name is None:
+                continue
+            vop = gate_vop(name)
+            if kind == IF and vop not in PAULI_FRAMES:
+                return False
+            if vop is None and name not in TWO_QUBIT_GATES:
+                return False
+        return True
+    
+    def reference(self, sim) -> List[int]:
+        # Outcome of every measurement and whether every conditional gate ran, by row
+        funcs = self.compiled.dispatch(sim)
+        conditions = self.compiled.condition_bits
+        bits = bytearray(b'0' * self.compiled.nbits)
+        reference = []
+        for kind, gate, qubits, cbit, cond in self.compiled.program:
+            value = 0
+            if kind == APPLY:
+                funcs[gate](*qubits)
+            elif kind == MEASURE:
+                value = sim.measure(qubits[0])
+                bits[cbit] = 49 if value else 48
+            elif kind == RESET:
+                sim.reset(qubits[0])
+            else:
+                start, stop, expected = conditions[cond]
+                value = int(bits[start:stop] == expected)
+                if value:
+                    funcs[gate](*qubits)
+            reference.append(value)
+        return reference
+    
+    def outcome(self, reference: List[int]) -> bytearray:
+        # Classical bits of the reference shot as ASCII digits, bit 0 first
+        bits = bytearray(b'0' * self.compiled.nbits)
+        for (kind, _, _, cbit, _), value in zip(self.compiled.program, reference):
+            if kind == MEASURE:
+                bits[cbit] = 49 if value else 48
+        return bits
+    
+    def _random(self, *shape) -> np.ndarray:
+        return self.rng.integers(0, PauliFrameSampler.ONES, size=shape, dtype=np.uint64, endpoint=True)
+    
+    def _condition(self, record: np.ndarray, cond: int) -> np.ndarray:
+        # Shots whose register holds the value of the condition
+        start, stop, expected = self.compiled.condition_bits[cond]
+        mask = np.full(record.shape[1], PauliFrameSampler.ONES)
+        if expected is None:
+            return mask ^ mask
+        for bit, digit in zip(range(start, stop), expected):
+            mask &= record[bit] if digit == 49 else ~record[bit]
+        return mask
+    
+    @staticmethod
+    def _flip(bits: np.ndarray, shots: np.ndarray) -> None:
+        # Toggles the bit of every shot in a row of packed words
+        np.bitwise_xor.at(bits, shots >> 6, np.uint64(1) << (shots & 63).astype(np.uint64))
+    
+    @staticmethod
+    def _bits(mask: np.ndarray, shots: np.ndarray) -> np.ndarray:
+        # Bit of every shot in a row of packed words
+        return ((mask[shots >> 6] >> (shots & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+    
+    def frames(self, reference: List[int], shots: int) -> np.ndarray:
+        # Classical bits of every shot as rows of packed words, shot k in bit k % 64 of word k // 64
+        words = -(-shots // PauliFrameSampler.WORD)
+        gates = self.compiled.gates
+        x = np.zeros((self.compiled.nqubits, words), dtype=np.uint64)
+        z = self._random(self.compiled.nqubits, words)
+        record = np.zeros((self.compiled.nbits, words), dtype=np.uint64)
+        masks = {}
+        events = {} if self.noise is None else self.noise.batch(shots, self.rng)
+        
+        for row, ((kind, gate, qubits, cbit, cond), value) in enumerate(zip(self.compiled.program, reference)):
+            if kind == MEASURE:
+                q = qubits[0]
+                record[cbit] = x[q] ^ PauliFrameSampler.ONES if value else x[q]
+                z[q] ^= self._random(words)
+            elif kind == RESET:
+                q = qubits[0]
+                x[q] = 0
+                z[q] = self._random(words)
+            elif kind == IF:
+                if cond not in masks:
+                    masks[cond] = self._condition(record, cond)
+                # Shots that took the other branch than the reference
+                flips = ~masks[cond] if value else masks[cond]
+                px, pz = PAULI_FRAMES[gate_vop(gates[gate])]
+                if px:
+                    x[qubits[0]] ^= flips
+                if pz:
+                    z[qubits[0]] ^= flips
+            elif len(qubits) == 1:
+                (a, b), (c, d) = VOP_FRAMES[gate_vop(gates[gate])]
+                q = qubits[0]
+                if (a, b, c, d) != (1, 0, 0, 1):
+                    fx, fz = x[q].copy(), z[q].copy()
+                    x[q], z[q] = (fx if a else 0) ^ (fz if b else 0), (fx if c else 0) ^ (fz if d else 0)
+            else:
+                q0, q1 = qubits
+                name = gates[gate]
+                if name == 'cx':
+                    x[q1] ^= x[q0]
+                    z[q0] ^= z[q1]
+                elif name == 'cz':
+                    z[q0] ^= x[q1]
+                    z[q1] ^= x[q0]
+                elif name == 'cy':
+                    z[q0] ^= z[q1] ^ x[q1]
+                    x[q1] ^= x[q0]
+                    z[q1] ^= x[q0]
+                else:
+                    x[[q0, q1]] = x[[q1, q0]]
+                    z[[q0, q1]] = z[[q1, q0]]
+            
+            for targets, flip, hit, errors in events.get(row, ()):
+                if flip:
+                    PauliFrameSampler._flip(record[cbit], hit)
+                    continue
+                if kind == IF:
+                    # Gates that did not run in a shot do not fail in it either
+                    taken = PauliFrameSampler._bits(masks[cond], hit)
+                    hit, errors = hit[taken], errors[taken]
+                for i, qubit in enumerate(targets):
+                    digits = (errors >> (2 * i)) & 3
+                    PauliFrameSampler._flip(x[qubit], hit[(digits & 1) == 1])
+                    PauliFrameSampler._flip(z[qubit], hit[(digits & 2) == 2])
+        return record
+    
+    @staticmethod
+    def shots(record: np.ndarray, shots: int) -> Shots:
+        # Transposes the record into one packed row of classical bits per shot
+        nbits = record.shape[0]
+        nbytes = -(-nbits // 8)
+        packed = np.zeros((shots, nbytes), dtype=np.uint8)
+        if nbits == 0:
+            return Shots(packed, nbits)
+        step = PauliFrameSampler.CHUNK_SHOTS // PauliFrameSampler.WORD
+        for start in range(0, record.shape[1], step):
+            first = start * PauliFrameSampler.WORD
+            block = np.ascontiguousarray(record[:, start:start + step])
+            bits = np.unpackbits(block.view(np.uint8), axis=1, bitorder='little')[:, :shots - first]
+            # Packs eight classical bits of every shot into a byte with contiguous row
+            # operations, transposing the bits directly is an order of magnitude slower
+            groups = np.zeros((nbytes * 8, bits.shape[1]), dtype=np.uint8)
+            groups[:nbits] = bits
+            groups = groups.reshape(nbytes, 8, -1)
+            rows = np.zeros((nbytes, bits.shape[1]), dtype=np.uint8)
+            for k in range(8):
+                rows |= groups[:, k] << np.uint8(k)
+            packed[first:first + bits.shape[1]] = rows.T
+        return Shots(packed, nbits)
+    
+    def sample(self, sim, shots: int) -> Shots:
+        return PauliFrameSampler.shots(self.frames(self.reference(sim), shots), shots)
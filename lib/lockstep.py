@@ -0,0 +1,45 @@
+import numpy as np
+from typing import Dict, List, Tuple
+from .compiled import CompiledCircuit, APPLY, MEASURE, IF, RESET
+from .noise import PAULI_GATES
+
+def lockstep_bits(compiled: CompiledCircuit, sim, events: Dict[int, List[Tuple[Tuple[int, ...], bool, np.ndarray, np.ndarray]]] = None) -> np.ndarray:
+    # Classical bits of all the shots of a lockstep backend as a (shots, nbits) array of
+    # 0 and 1, with the errors of NoiseLocations.batch applied after their rows
+    funcs = compiled.dispatch(sim)
+    bits = np.zeros((sim.shots, compiled.nbits), dtype=np.uint8)
+    events = {} if events is None else events
+    masks = {}
+    
+    for row, (kind, gate, qubits, cbit, cond) in enumerate(compiled.program):
+        if kind == APPLY:
+            funcs[gate](*qubits)
+        elif kind == MEASURE:
+            bits[:, cbit] = sim.measure(qubits[0])
+        elif kind == RESET:
+            sim.reset(qubits[0])
+        else:
+            if cond not in masks:
+                start, stop, expected = compiled.condition_bits[cond]
+                if expected is None:
+                    masks[cond] = np.zeros(sim.shots, dtype=bool)
+                else:
+                    masks[cond] = (bits[:, start:stop] == np.frombuffer(expected, dtype=np.uint8) - 48).all(axis=1)
+            sim.apply_where(masks[cond], compiled.gates[gate], *qubits)
+        
+        for targets, flip, hit, errors in events.get(row, ()):
+            if flip:
+                bits[hit, cbit] ^= 1
+                continue
+            if kind == IF:
+                # Gates that did not run in a shot do not fail in it either
+                taken = masks[cond][hit]
+                hit, errors = hit[taken], errors[taken]
+            for i, qubit in enumerate(targets):
+                digits = (errors >> (2 * i)) & 3
+                for digit, pauli in PAULI_GATES.items():
+                    shots = np.zeros(sim.shots, dtype=bool)
+                    shots[hit[digits == digit]] = True
+                    if shots.any():
+                        sim.apply_where(shots, pauli, qubit)
+    return bits
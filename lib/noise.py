@@ -0,0 +1,151 @@
+import numpy as np
+from enum import Enum
+from itertools import islice
+from typing import Dict, List, Tuple
+from .circuit import QuantumCircuit, CircuitOp
+from .compiled import CompiledCircuit, APPLY, MEASURE, RESET
+
+Channel = Enum('Channel', ['DEPOLARIZING', 'BIT_FLIP', 'MEASUREMENT_FLIP'])
+
+# Pauli of every base 4 digit of an error, digit i acts on the i-th qubit of the operation.
+# Bit 0 of a digit is the X component and bit 1 the Z component.
+PAULI_GATES = {1: 'x', 2: 'z', 3: 'y'}
+
+class NoiseModel:
+    # Channels applied after every operation of a gate type ('measure' and 'reset'
+    # included) or after single operations, by index in QuantumCircuit.operations
+    def __init__(self) -> None:
+        self.gates: Dict[str, List[Tuple[Channel, float]]] = {}
+        self.operations: Dict[int, List[Tuple[Channel, float]]] = {}
+    
+    @staticmethod
+    def _check(channel: Channel, p: float) -> None:
+        assert isinstance(channel, Channel), 'unknown noise channel'
+        assert 0 <= p <= 1, 'noise probability must be between 0 and 1'
+    
+    def add_gate_noise(self, gate: str, channel: Channel, p: float) -> None:
+        # Other channels after a measurement act on the measured qubit, not on its record
+        NoiseModel._check(channel, p)
+        assert gate == 'measure' or channel != Channel.MEASUREMENT_FLIP, 'measurement flips only apply to measurements'
+        self.gates.setdefault(gate, []).append((channel, p))
+    
+    def add_operation_noise(self, circ: QuantumCircuit, index: int, channel: Channel, p: float) -> None:
+        NoiseModel._check(channel, p)
+        assert 0 <= index < len(circ.operations), 'operation index out of range'
+        assert circ.operations[index][0] == CircuitOp.MEASURE or channel != Channel.MEASUREMENT_FLIP, 'measurement flips only apply to measurements'
+        self.operations.setdefault(index, []).append((channel, p))
+    
+    def locations(self, compiled: CompiledCircuit) -> 'NoiseLocations':
+        entries = []
+        for row, (kind, gate, targets, _, _) in enumerate(compiled.program):
+            name = 'measure' if kind == MEASURE else 'reset' if kind == RESET else compiled.gates[gate]
+            for channel, p in self.gates.get(name, []) + self.operations.get(compiled.origin[row], []):
+                if p == 0:
+                    continue
+                if channel == Channel.MEASUREMENT_FLIP:
+                    entries.append((row, (), p, 2, True))
+                elif channel == Channel.DEPOLARIZING:
+                    # Any of the 4^n - 1 Paulis other than the identity on the n qubits
+                    entries.append((row, targets, p, 4 ** len(targets), False))
+                else:
+                    entries.extend((row, (qubit, ), p, 2, False) for qubit in targets)
+        return NoiseLocations(entries)
+
+class NoiseLocations:
+    # Places of a compiled circuit where an error can happen. An error is drawn with the
+    # probability of its location and is a number in [1, high) whose base 4 digits are
+    # the Paulis applied, or a flip of the classical bit of a measurement when the location
+    # is a record flip.
+    def __init__(self, entries: List[Tuple[int, Tuple[int, ...], float, int, bool]]) -> None:
+        # (row, qubits, probability, high, record flip) of every location
+        self.rows = np.array([row for row, _, _, _, _ in entries], dtype=np.int64)
+        self.qubits = [qubits for _, qubits, _, _, _ in entries]
+        self.probs = np.array([p for _, _, p, _, _ in entries], dtype=np.float64)
+        self.highs = np.array([high for _, _, _, high, _ in entries], dtype=np.int64)
+        self.flips = [flip for _, _, _, _, flip in entries]
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def _events(self, hits: np.ndarray, errors: np.ndarray) -> Dict[int, List[Tuple[Tuple[int, ...], bool, int]]]:
+        events = {}
+        for location, error in zip(hits.tolist(), errors.tolist()):
+            events.setdefault(int(self.rows[location]), []).append((self.qubits[location], self.flips[location], error))
+        return events
+    
+    def draw(self, rng: np.random.Generator) -> Dict[int, List[Tuple[Tuple[int, ...], bool, int]]]:
+        # Errors of a single shot by row, every location is decided by the same call
+        hits = np.flatnonzero(rng.random(len(self.probs)) < self.probs)
+        return self._events(hits, rng.integers(1, self.highs[hits]))
+    
+    @staticmethod
+    def _bernoulli(cells: int, p: float, rng: np.random.Generator) -> np.ndarray:
+        # Sorted indices of the cells hit by independent events of probability p, found
+        # from geometric gaps so the cost follows the number of hits, not of cells
+        if p == 1:
+            return np.arange(cells, dtype=np.int64)
+        mean = cells * p
+        size = int(mean + 5 * np.sqrt(mean)) + 16
+        positions = []
+        last = -1
+        while True:
+            steps = last + np.cumsum(rng.geometric(p, size))
+            positions.append(steps[steps < cells])
+            if steps[-1] >= cells:
+                return np.concatenate(positions)
+            last = int(steps[-1])
+    
+    def batch(self, shots: int, rng: np.random.Generator) -> Dict[int, List[Tuple[Tuple[int, ...], bool, np.ndarray, np.ndarray]]]:
+        # Errors of all shots by row as (qubits, record flip, shots hit, errors), locations that share
+        # a probability are drawn together as one grid of locations by shots
+        locations, hit_shots = [], []
+        for p in np.unique(self.probs).tolist():
+            group = np.flatnonzero(self.probs == p)
+            cells = NoiseLocations._bernoulli(len(group) * shots, p, rng)
+            locations.append(group[cells // shots])
+            hit_shots.append(cells % shots)
+        if not locations:
+            return {}
+        locations = np.concatenate(locations)
+        hit_shots = np.concatenate(hit_shots)
+        order = np.argsort(locations, kind='stable')
+        locations, hit_shots = locations[order], hit_shots[order]
+        errors = rng.integers(1, self.highs[locations])
+        
+        events = {}
+        bounds = np.searchsorted(locations, np.arange(len(self) + 1))
+        for location in np.flatnonzero(np.diff(bounds)).tolist():
+            start, stop = bounds[location], bounds[location + 1]
+            events.setdefault(int(self.rows[location]), []).append((self.qubits[location], self.flips[location], hit_shots[start:stop], errors[start:stop]))
+        return events
+    
+    def bits(self, compiled: CompiledCircuit, sim, rng: np.random.Generator, start: int = 0) -> bytearray:
+        # CompiledCircuit.bits with the errors of one shot applied after their rows, no
+        # location may be before start
+        events = self.draw(rng)
+        funcs = compiled.dispatch(sim)
+        conditions = compiled.condition_bits
+        bits = bytearray(b'0' * compiled.nbits)
+        
+        for row, (kind, gate, qubits, cbit, cond) in enumerate(islice(compiled.program, start, None), start):
+            if kind == APPLY:
+                funcs[gate](*qubits)
+            elif kind == MEASURE:
+                bits[cbit] = 49 if sim.measure(qubits[0]) else 48
+            elif kind == RESET:
+                sim.reset(qubits[0])
+            else:
+                lo, hi, expected = conditions[cond]
+                if bits[lo:hi] != expected:
+                    continue
+                funcs[gate](*qubits)
+            for targets, flip, error in events.get(row, ()):
+                if flip:
+                    bits[cbit] ^= 1
+                    continue
+                for i, qubit in enumerate(targets):
+                    digit = (error >> (2 * i)) & 3
+                    if digit:
+                        sim.apply_gate(PAULI_GATES[digit], qubit)
+        
+        return bits
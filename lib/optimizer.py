@@ -0,0 +1,97 @@
+import sys
+from typing import Dict, List
+from .circuit import QuantumCircuit, CircuitOp
+
+sys.path.append('..')
+from simulators.clifford import GraphStateSimulator, GATE_VOPS, VOP_NAMES, DIAGONAL_VOPS, vop_gate
+
+# Two-qubit gates that are their own inverse, CZ and SWAP are also symmetric in their qubits
+SELF_INVERSE = {'cx', 'cy', 'cz', 'swap'}
+SYMMETRIC = {'cz', 'swap'}
+
+class PeepholeOptimizer:
+    # Single pass over the operations of a circuit. Runs of single-qubit Cliffords are
+    # multiplied into one element of the local Clifford group and held back until an
+    # operation that does not commute with them touches the qubit, adjacent pairs of
+    # self-inverse two-qubit gates cancel, and diagonal elements are moved through CZ
+    # and through the control of CX.
+    def __init__(self, operations: List) -> None:
+        self.operations = operations
+        self._pending: Dict[int, int] = {}
+        self._operations: List = []
+        # Index in _operations of the operations acting on every qubit, last one on top
+        self._history: Dict[int, List[int]] = {}
+    
+    def _flush(self, qubit: int) -> None:
+        vop = self._pending.pop(qubit, 0)
+        if vop == 0:
+            return
+        self._emit((CircuitOp.APPLY, VOP_NAMES.get(vop, vop_gate(vop)), qubit), [qubit])
+    
+    def _emit(self, operation, qubits) -> None:
+        for qubit in qubits:
+            self._history.setdefault(qubit, []).append(len(self._operations))
+        self._operations.append(operation)
+    
+    def _commutes(self, gate: str, qubit: int, position: int) -> bool:
+        # Whether the pending element of qubit can be moved through gate
+        if self._pending.get(qubit, 0) not in DIAGONAL_VOPS:
+            return False
+        return gate == 'cz' or (gate == 'cx' and position == 0)
+    
+    def _cancels(self, name: str, qubits) -> bool:
+        if name not in SELF_INVERSE:
+            return False
+        a, b = qubits
+        history_a, history_b = self._history.get(a), self._history.get(b)
+        if not history_a or not history_b or history_a[-1] != history_b[-1]:
+            return False
+        previous = self._operations[history_a[-1]]
+        if previous is None or previous[0] != CircuitOp.APPLY or previous[1] != name:
+            return False
+        return tuple(previous[2:]) == (a, b) or (name in SYMMETRIC and tuple(previous[2:]) == (b, a))
+    
+    def _apply(self, name: str, qubits) -> None:
+        if len(qubits) == 1 and name in GATE_VOPS:
+            qubit = qubits[0]
+            self._pending[qubit] = int(GraphStateSimulator.LOCAL_CLIFFORD_GROUP[GATE_VOPS[name], self._pending.get(qubit, 0)])
+            return
+        
+        for position, qubit in enumerate(qubits):
+            if not self._commutes(name, qubit, position):
+                self._flush(qubit)
+        if len(qubits) == 2 and self._cancels(name, qubits):
+            index = self._history[qubits[0]].pop()
+            self._history[qubits[1]].pop()
+            self._operations[index] = None
+            return
+        self._emit((CircuitOp.APPLY, name, *qubits), qubits)
+    
+    def run(self) -> List:
+        for op, name, *args in self.operations:
+            if op == CircuitOp.APPLY:
+                self._apply(name, args)
+            elif op in (CircuitOp.MEASURE, CircuitOp.RESET):
+                self._flush(args[0])
+                self._emit((op, name, *args), [args[0]])
+            elif op == CircuitOp.IF:
+                qubits = sorted({qubit for _, _, *body in args[2] for qubit in body})
+                for qubit in qubits:
+                    self._flush(qubit)
+                self._emit((op, name, *args), qubits)
+            else:
+                raise NotImplementedError(f'{op} operations can not be optimized')
+        for qubit in sorted(self._pending):
+            self._flush(qubit)
+        
+        return [operation for operation in self._operations if operation is not None]
+
+def fuse(operations: List) -> List:
+    return PeepholeOptimizer(operations).run()
+
+def optimize(circ: QuantumCircuit) -> int:
+    # Rewrites the operations of circ in place and returns how many were removed
+    operations = fuse(circ.operations)
+    removed = len(circ.operations) - len(operations)
+    circ.operations = operations
+    return removed
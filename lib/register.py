@@ -2,18 +2,6 @@ from .error import *
 from enum import Enum
 from typing import Union
 
-class Bit:
-    def __init__(self) -> None:
-        self._val = 0
-    
-    @property
-    def val(self):
-        return self._val
-    @val.setter
-    def val(self, value: int):
-        assert value in [1, 0], 'bit only accepts 1 or 0 as values'
-        self._val = value
-
 class Qubit:
     def __init__(self) -> None:
         self._collapsed = False
@@ -32,9 +20,7 @@ class Register:
         self.size = size
         self.name = name
         self.type = type
-        if type == RegisterType.Classical:
-            self.register = [Bit() for _ in range(size)]
-        else:
+        if type == RegisterType.Quantum:
             self.register = [Qubit() for _ in range(size)]
         
         # Simulator helper
@@ -46,7 +32,7 @@ class Register:
     def __len__(self) -> int:
         return self.size
     
-    def __getitem__(self, idx) -> Union[Bit, Qubit]:
+    def __getitem__(self, idx) -> Union[int, Qubit]:
         return self.register[idx]
     
     def __iter__(self) -> object:
@@ -56,19 +42,33 @@ class Register:
 class ClassicalRegister(Register):
     def __init__(self, size: int, name: str) -> None:
         super().__init__(size, name, RegisterType.Classical)
+        # Bits packed into an integer, bit idx of the register is bit idx of value
+        self.value = 0
+    
+    def __getitem__(self, idx: int) -> int:
+        if not 0 <= idx < self.size:
+            raise OutOfBoundsError(f'{self.name} has not index {idx}')
+        return (self.value >> idx) & 1
+    
+    def __iter__(self) -> object:
+        for idx in range(self.size):
+            yield (self.value >> idx) & 1
+    
+    def set_bit(self, idx: int, val: int) -> None:
+        assert val in [1, 0], 'bit only accepts 1 or 0 as values'
+        if not 0 <= idx < self.size:
+            raise OutOfBoundsError(f'{self.name} has not index {idx}')
+        self.value = self.value | (1 << idx) if val else self.value & ~(1 << idx)
     
     def to_binary_string(self) -> str:
-        s = ''
-        for b in self.register:
-            s = str(b.val) + s
-        return s
+        return format(self.value, f'0{self.size}b')
     
     def to_int(self) -> int:
-        return int(self.to_binary_string(), 2)
+        return self.value
 
 class QuantumRegister(Register):
     def __init__(self, size: int, name: str) -> None:
         super().__init__(size, name, RegisterType.Quantum)
     
     def collapse(self, qidx: int):
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,59 @@
+import numpy as np
+from collections import Counter
+from typing import Tuple
+
+class ClassicalState:
+    # Classical bits of a single run as ASCII digits with bit 0 first, kept apart from the
+    # registers of the circuit so that runs of the same circuit do not share state
+    def __init__(self, nbits: int) -> None:
+        self.bits = bytearray(b'0' * nbits)
+    
+    def set(self, bit: int, val: int) -> None:
+        self.bits[bit] = 49 if val else 48
+    
+    def value(self, offset: int, size: int) -> int:
+        return int(self.bits[offset:offset + size][::-1], 2)
+    
+    def result(self) -> str:
+        # Highest classical bit first, as the registers concatenated in reverse order
+        return self.bits[::-1].decode()
+
+class Shots:
+    # Classical bits of every shot as one row of bytes, bit k of the circuit is bit k % 8
+    # of byte k // 8. Strings are only built for the distinct rows when counts are asked.
+    def __init__(self, packed: np.ndarray, nbits: int) -> None:
+        assert packed.ndim == 2 and packed.shape[1] == -(-nbits // 8), 'packed rows do not match the number of bits'
+        self.packed = packed
+        self.nbits = nbits
+    
+    def __len__(self) -> int:
+        return self.packed.shape[0]
+    
+    @staticmethod
+    def from_ascii(bits: bytes, shots: int, nbits: int) -> 'Shots':
+        # Rows of ASCII digits with bit 0 first, as CompiledCircuit.bits writes them
+        digits = np.frombuffer(bits, dtype=np.uint8).reshape(shots, nbits) - 48
+        return Shots(np.packbits(digits, axis=1, bitorder='little'), nbits)
+    
+    @staticmethod
+    def repeat(bits: bytes, shots: int, nbits: int) -> 'Shots':
+        # The same row of ASCII digits in every shot
+        return Shots(np.repeat(Shots.from_ascii(bits, 1, nbits).packed, shots, axis=0), nbits)
+    
+    def unpack(self) -> np.ndarray:
+        # (shots, nbits) array of 0 and 1 with bit k in column k
+        return np.unpackbits(self.packed, axis=1, count=self.nbits, bitorder='little')
+    
+    def histogram(self) -> Tuple[np.ndarray, np.ndarray]:
+        # Distinct packed rows and how many shots produced each
+        if self.nbits == 0:
+            return self.packed[:1], np.array([len(self)] if len(self) else [], dtype=np.int64)
+        rows = np.ascontiguousarray(self.packed).view(np.dtype((np.void, self.packed.shape[1]))).ravel()
+        outcomes, counts = np.unique(rows, return_counts=True)
+        return outcomes.view(np.uint8).reshape(-1, self.packed.shape[1]), counts
+    
+    def counts(self) -> Counter:
+        # Strings with the highest classical bit first, as Executor._result
+        outcomes, counts = self.histogram()
+        bits = np.unpackbits(outcomes, axis=1, count=self.nbits, bitorder='little')[:, ::-1] + 48
+        return Counter({row.tobytes().decode(): count for row, count in zip(bits, counts.tolist())})
@@ -0,0 +1,72 @@
+import math
+from typing import Dict, Optional
+
+from .token import Token
+
+class Expression:
+    def evaluate(self, env: Optional[Dict[str, float]] = None) -> float:
+        raise NotImplementedError('Unimplemented evaluate function')
+    
+    def is_constant(self) -> bool:
+        return False
+
+class Number(Expression):
+    def __init__(self, value: float) -> None:
+        self.value = value
+    def evaluate(self, env: Optional[Dict[str, float]] = None) -> float:
+        return self.value
+    def is_constant(self) -> bool:
+        return True
+    def __str__(self) -> str:
+        return f'{self.value:g}'
+
+class Parameter(Expression):
+    def __init__(self, name: str) -> None:
+        self.name = name
+    def evaluate(self, env: Optional[Dict[str, float]] = None) -> float:
+        if env is None or self.name not in env:
+            raise NameError(f'unknown parameter {self.name}')
+        return env[self.name]
+    def __str__(self) -> str:
+        return self.name
+
+class UnaryOp(Expression):
+    FUNCTIONS = {
+        Token.Minus: lambda x: -x, Token.Sin: math.sin, Token.Cos: math.cos, Token.Tan: math.tan,
+        Token.Exp: math.exp, Token.Ln: math.log, Token.Sqrt: math.sqrt
+    }
+    NAMES = {Token.Minus: '-', Token.Sin: 'sin', Token.Cos: 'cos', Token.Tan: 'tan', Token.Exp: 'exp', Token.Ln: 'ln', Token.Sqrt: 'sqrt'}
+    
+    def __init__(self, op: int, operand: Expression) -> None:
+        self.op = op
+        self.operand = operand
+    def evaluate(self, env: Optional[Dict[str, float]] = None) -> float:
+        return UnaryOp.FUNCTIONS[self.op](self.operand.evaluate(env))
+    def __str__(self) -> str:
+        return f'{UnaryOp.NAMES[self.op]}({self.operand})'
+
+class BinaryOp(Expression):
+    FUNCTIONS = {
+        Token.Plus: lambda a, b: a + b, Token.Minus: lambda a, b: a - b, Token.Times: lambda a, b: a * b,
+        Token.Divide: lambda a, b: a / b,
+        # math.pow raises ValueError where a ** b would give a complex, as (-8)^(1/3)
+        Token.Power: math.pow
+    }
+    NAMES = {Token.Plus: '+', Token.Minus: '-', Token.Times: '*', Token.Divide: '/', Token.Power: '^'}
+    
+    def __init__(self, op: int, left: Expression, right: Expression) -> None:
+        self.op = op
+        self.left = left
+        self.right = right
+    def evaluate(self, env: Optional[Dict[str, float]] = None) -> float:
+        return BinaryOp.FUNCTIONS[self.op](self.left.evaluate(env), self.right.evaluate(env))
+    def __str__(self) -> str:
+        return f'({self.left} {BinaryOp.NAMES[self.op]} {self.right})'
+
+def fold(expr: Expression) -> Expression:
+    # Replaces an operation over constants by its value
+    if isinstance(expr, UnaryOp) and expr.operand.is_constant():
+        return Number(expr.evaluate())
+    if isinstance(expr, BinaryOp) and expr.left.is_constant() and expr.right.is_constant():
+        return Number(expr.evaluate())
+    return expr
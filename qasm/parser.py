@@ -1,13 +1,17 @@
-from typing import Tuple, List, Union
+import math
+from typing import Iterator, Tuple, List, Union
 from more_itertools import peekable
 
 from .token import Token
 from .tokenizer import Tokenizer
 from .instruction import *
+from .expression import Expression, Number, Parameter, UnaryOp, BinaryOp, fold
 from .error import *
 
 class Parser:
     VERSIONS = [2.0]
+    # Bumped whenever parsing or lowering produce different operations for the same source
+    REVISION = 5
     def __init__(self, tokens: Tokenizer) -> None:
         self.tokens = peekable(tokens)
     
@@ -80,24 +84,98 @@ class Parser:
             args.append(self.read_argument())
         return args
     
-    def read_mathexpr(self) -> Token:
-        # TODO: read math expression
-        return Token(Token.Illegal)
+    def read_mathexpr(self) -> Expression:
+        # exp := term (('+' | '-') term)*
+        expr = self.read_term()
+        while self.safe_peek() == Token.Plus or self.safe_peek() == Token.Minus:
+            op = self.next_token().id
+            expr = self.fold(BinaryOp(op, expr, self.read_term()))
+        return expr
     
-    def read_mathexpr_list(self) -> Token:
-        # TODO: read math expression list
-        return Token(Token.Illegal)
+    def read_term(self) -> Expression:
+        # term := unary (('*' | '/') unary)*
+        expr = self.read_unary()
+        while self.safe_peek() == Token.Times or self.safe_peek() == Token.Divide:
+            op = self.next_token().id
+            expr = self.fold(BinaryOp(op, expr, self.read_unary()))
+        return expr
+    
+    def read_unary(self) -> Expression:
+        # unary := '-' unary | atom ('^' unary)?
+        if self.safe_peek() == Token.Minus:
+            self.next_token()
+            return self.fold(UnaryOp(Token.Minus, self.read_unary()))
+        expr = self.read_atom()
+        if self.safe_peek() == Token.Power:
+            self.next_token()
+            expr = self.fold(BinaryOp(Token.Power, expr, self.read_unary()))
+        return expr
+    
+    def read_atom(self) -> Expression:
+        token = self.next_token()
+        if token == Token.Real or token == Token.Integer:
+            return Number(token.data)
+        elif token == Token.Pi:
+            return Number(math.pi)
+        elif token == Token.Id:
+            return Parameter(token.data)
+        elif token.id in UnaryOp.FUNCTIONS:
+            self.next_must_be(Token.LParen, 'missing open parenthesis')
+            expr = self.read_mathexpr()
+            self.next_must_be(Token.RParen, 'missing close parenthesis')
+            return self.fold(UnaryOp(token.id, expr))
+        elif token == Token.LParen:
+            expr = self.read_mathexpr()
+            self.next_must_be(Token.RParen, 'missing close parenthesis')
+            return expr
+        else:
+            raise MalformedExpressionError(f'unexpected symbol {token.text} in expression')
+    
+    @staticmethod
+    def fold(expr: Expression) -> Expression:
+        try:
+            return fold(expr)
+        except (ArithmeticError, ValueError) as e:
+            raise MalformedExpressionError(f'invalid constant expression {expr}: {e}')
+    
+    def read_mathexpr_list(self) -> List[Expression]:
+        exprs = []
+        exprs.append(self.read_mathexpr())
+        while self.safe_peek() == Token.Comma:
+            self.next_token()
+            exprs.append(self.read_mathexpr())
+        
+        return exprs
     
     def parse(self) -> QasmProgram:
         main = self.parse_header()
         if main.version not in Parser.VERSIONS:
             raise UnsupportedVersion
         
-        while self.safe_peek() is not None:
-            instruction = self.parse_next()
-            main.prog.append(instruction)
+        main.prog.extend(self.parse_instructions())
         
         return main
+    
+    def stream(self) -> Iterator[QInstruction]:
+        # Checks the header eagerly and then parses one instruction at a time
+        main = self.parse_header()
+        if main.version not in Parser.VERSIONS:
+            raise UnsupportedVersion
+        
+        return self.parse_instructions()
+    
+    def parse_instructions(self) -> Iterator[QInstruction]:
+        while self.safe_peek() is not None:
+            yield self.parse_next()
+    
+    def parse_library(self) -> List[QInstruction]:
+        # Include files have no header and may only declare gates or include other files
+        declarations = []
+        for ins in self.parse_instructions():
+            if not isinstance(ins, (Gate, Opaque, Include)):
+                raise MalformedExpressionError(f'only declarations are allowed in an include file, found {ins}')
+            declarations.append(ins)
+        return declarations
 
     def parse_next(self) -> QInstruction:
         token = self.next_token()
@@ -119,6 +197,8 @@ class Parser:
             return self.parse_gate()
         elif token == Token.If:
             return self.parse_if()
+        elif token == Token.Include:
+            return self.parse_include()
         else:
             raise MalformedExpressionError(f'unexpected symbol {token.text}')
     
@@ -131,6 +211,14 @@ class Parser:
 
         return QasmProgram(version.data, [])
     
+    def parse_include(self) -> Include:
+        filename = self.next_token()
+        if filename != Token.Filename:
+            raise MalformedExpressionError('missing filename of include')
+        self.read_semicolon()
+        
+        return Include(filename.data)
+    
     def parse_qreg(self) -> QReg:
         id = self.read_identifier()
         self.next_must_be(Token.LSParen, 'missing open square bracket')
@@ -186,8 +274,8 @@ class Parser:
             if self.safe_peek() == Token.RParen:
                 self.next_token()
             else:
-                params = self.read_mathexpr_list() # Bug here!
-                self.next_must_be(Token.RParen)
+                params = self.read_mathexpr_list()
+                self.next_must_be(Token.RParen, 'missing close parenthesis')
         args = self.read_args_list()
         self.read_semicolon()
         
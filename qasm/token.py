@@ -45,6 +45,8 @@ class Token:
     # Strings
     Filename = 37
 
+    __slots__ = ('id', 'data', 'text')
+
     def __init__(self, id: int, data: Any = None, text: str = '') -> None:
         self.id = id
         self.data = data
@@ -62,42 +64,13 @@ class Token:
     def __repr__(self) -> str:
         return str(self)
 
-def resolve_identifier(id: str) -> Token:
-    if id == 'OPENQASM':
-        return Token(Token.OpenQASM)
+KEYWORDS = {
+    'OPENQASM': Token.OpenQASM,
     # Mathematical expressions
-    elif id == 'sin':
-        return Token(Token.Sin)
-    elif id == 'cos':
-        return Token(Token.Cos)
-    elif id == 'tan':
-        return Token(Token.Tan)
-    elif id == 'exp':
-        return Token(Token.Exp)
-    elif id == 'ln':
-        return Token(Token.Ln)
-    elif id == 'sqrt':
-        return Token(Token.Sqrt)
-    elif id == 'pi':
-        return Token(Token.Pi)
+    'sin': Token.Sin, 'cos': Token.Cos, 'tan': Token.Tan, 'exp': Token.Exp,
+    'ln': Token.Ln, 'sqrt': Token.Sqrt, 'pi': Token.Pi,
     # Reserved words
-    elif id == 'qreg':
-        return Token(Token.QReg)
-    elif id == 'creg':
-        return Token(Token.CReg)
-    elif id == 'barrier':
-        return Token(Token.Barrier)
-    elif id == 'gate':
-        return Token(Token.Gate)
-    elif id == 'measure':
-        return Token(Token.Measure)
-    elif id == 'reset':
-        return Token(Token.Reset)
-    elif id == 'include':
-        return Token(Token.Include)
-    elif id == 'opaque':
-        return Token(Token.Opaque)
-    elif id == 'if':
-        return Token(Token.If)
-    else:
-        return Token(Token.Id, id)
+    'qreg': Token.QReg, 'creg': Token.CReg, 'barrier': Token.Barrier, 'gate': Token.Gate,
+    'measure': Token.Measure, 'reset': Token.Reset, 'include': Token.Include,
+    'opaque': Token.Opaque, 'if': Token.If
+}
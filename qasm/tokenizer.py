@@ -1,120 +1,86 @@
-from .token import Token, resolve_identifier
+import re
+from .token import Token, KEYWORDS
 from .error import QasmSyntaxError
 
+SYMBOLS = {
+    '==': Token.Equals, '->': Token.Arrow, '+': Token.Plus, '-': Token.Minus,
+    '*': Token.Times, '/': Token.Divide, '^': Token.Power, ';': Token.Semicolon,
+    ',': Token.Comma, '(': Token.LParen, '[': Token.LSParen, '{': Token.LCParen,
+    ')': Token.RParen, ']': Token.RSParen, '}': Token.RCParen
+}
+
+# Whitespace and comments are skipped in front of every token, the final empty
+# match only consumes trailing blanks at the end of the source
+TOKEN_PATTERN = re.compile(r'''
+    (?:\s|//[^\n]*)*
+    (?:
+        (?P<id>[^\W\d]\w*)
+      | (?P<number>\d[\d.]*)
+      | (?P<symbol>==|->|[-+*/^;,()\[\]{}])
+      | (?P<filename>"[^"]*"?)
+      | (?P<equals>=)
+      | (?P<illegal>.)
+      | $
+    )
+''', re.VERBOSE | re.DOTALL)
+
 class Tokenizer:
+    CHUNK_SIZE = 1 << 16
+
     def __init__(self, input) -> None:
-        self.input = list(input)
-        self.idx = -1
-    
-    def read(self) -> str:
-        self.idx += 1
-        if self.idx >= len(self.input):
-            return None
-        return self.input[self.idx]
-    
-    def peek(self) -> str:
-        if self.idx + 1 >= len(self.input):
-            return None
-        return self.input[self.idx + 1]
+        # Either the whole source as a string or a file handle that is read in chunks
+        self.input = input
+        self._tokens = self.scan()
     
-    def skip_whitespace(self) -> None:
-        while self.peek() is not None and self.peek().isspace():
-            self.read()
-    
-    def skip_comment(self) -> None:
-        while self.peek() is not None and self.peek() != '\n':
-            self.read()
-    
-    def read_id(self, first: str) -> str:
-        id = first
-        while self.peek().isalnum() or self.peek() == '_':
-            id += self.read()
-        return id
-    
-    def read_number(self, first: str) -> str:
-        number = first
+    def scan(self):
+        if isinstance(self.input, str):
+            yield from self.scan_text(self.input, True)
+            return
+        
+        pending = ''
         while True:
-            peek = self.peek()
-            if not peek.isnumeric() and peek != '.':
-                break
-            number += self.read()
-        return number
+            chunk = self.input.read(Tokenizer.CHUNK_SIZE)
+            final = len(chunk) == 0
+            text = pending + chunk
+            consumed = yield from self.scan_text(text, final)
+            if final:
+                return
+            pending = text[consumed:]
     
-    def read_filename(self) -> str:
-        filename = ''
-        while self.peek() is not None and self.peek() != '"':
-            filename += self.read()
-        self.read() # Skip last "
-        return filename
+    def scan_text(self, text: str, final: bool):
+        # Returns how much of text was consumed, a token touching the end of a
+        # non-final chunk may continue in the next one so it is left pending
+        for match in TOKEN_PATTERN.finditer(text):
+            if not final and match.end() == len(text):
+                return match.start()
+            kind = match.lastgroup
+            if kind == 'id':
+                value = match.group(kind)
+                keyword = KEYWORDS.get(value)
+                yield Token(Token.Id, value) if keyword is None else Token(keyword)
+            elif kind == 'symbol':
+                value = match.group(kind)
+                yield Token(SYMBOLS[value], text=value)
+            elif kind == 'number':
+                value = match.group(kind)
+                if '.' in value:
+                    yield Token(Token.Real, float(value))
+                else:
+                    yield Token(Token.Integer, int(value))
+            elif kind == 'filename':
+                value = match.group(kind)
+                yield Token(Token.Filename, value[1:-1] if value.endswith('"') and len(value) > 1 else value[1:])
+            elif kind == 'equals':
+                raise QasmSyntaxError('missing equal sign')
+            elif kind == 'illegal':
+                yield Token(Token.Illegal)
+        return len(text)
     
     def next(self) -> Token:
-        self.skip_whitespace()
-        c = self.read()
-        if c is None:
-            return Token(Token.EndOfFile)
-        elif c == '=':
-            if self.peek() == '=':
-                self.read()
-                return Token(Token.Equals, text='==')
-            else:
-                raise QasmSyntaxError('missing equal sign')
-        elif c == '+':
-            return Token(Token.Plus, text=c)
-        elif c == '-':
-            if self.peek() == '>':
-                self.read()
-                return Token(Token.Arrow, text='->')
-            else:
-                return Token(Token.Minus, text=c)
-        elif c == '*':
-            return Token(Token.Times, text=c)
-        elif c == '/':
-            if self.peek() == '/':
-                self.skip_comment()
-                return self.next()
-            else:
-                return Token(Token.Divide, text=c)
-        elif c == '^':
-            return Token(Token.Power, text=c)
-        elif c == ';':
-            return Token(Token.Semicolon, text=c)
-        elif c == ',':
-            return Token(Token.Comma, text=c)
-        elif c == '(':
-            return Token(Token.LParen, text=c)
-        elif c == '[':
-            return Token(Token.LSParen, text=c)
-        elif c == '{':
-            return Token(Token.LCParen, text=c)
-        elif c == ')':
-            return Token(Token.RParen, text=c)
-        elif c == ']':
-            return Token(Token.RSParen, text=c)
-        elif c == '}':
-            return Token(Token.RCParen, text=c)
-        elif c == '"':
-            filename = self.read_filename()
-            return Token(Token.Filename, filename)
-        elif c.isalpha() or c == '_':
-            identifier = self.read_id(c)
-            return resolve_identifier(identifier)
-        elif c.isnumeric():
-            num = self.read_number(c)
-            if '.' in num:
-                num = float(num)
-                return Token(Token.Real, num)
-            else:
-                num = int(num)
-                return Token(Token.Integer, num)
-        else:
-            return Token(Token.Illegal)
+        return next(self._tokens, Token(Token.EndOfFile))
     
     def __iter__(self):
         return self
     
     def __next__(self):
-        token = self.next()
-        if token == Token(Token.EndOfFile):
-            raise StopIteration
-        else:
-            return token
\ No newline at end of file
+        return next(self._tokens)
@@ -1,14 +1,25 @@
-from typing import Dict
+import random
+from collections import Counter
+from typing import Dict, List
 from types import MethodType
 
 class Simulator:
     X_BASIS = 1
     Y_BASIS = 2
     Z_BASIS = 3
-
+    # Whether the backend can draw many shots of the final state at once
+    SUPPORTS_SAMPLING = False
+    # Whether the backend runs many shots at once, it then takes the number of shots after nqubits
+    LOCKSTEP = False
+    
     def __init__(self, nqubits: int) -> None:
         assert nqubits > 0, 'nqubits must be greater that 0'
         self._gates = {}
+        # Source of the measurement outcomes, a seeded random.Random makes runs reproducible
+        self.random = random
+        # Measurements whose outcome was drawn from random, a run that drew none is
+        # deterministic and every other run gives the same outcome
+        self.random_draws = 0
     
     @property
     def gates(self) -> Dict:
@@ -19,16 +30,33 @@ class Simulator:
         self.__dict__[secure_name] = MethodType(func, self)
         self._gates[name] = self.__dict__[secure_name]
     
+    def add_unitary(self, name: str, matrix) -> None:
+        raise NotImplementedError(f'{self.__class__.__name__} does not support arbitrary single-qubit unitaries')
+    
     def apply_gate(self, gate: str, *args) -> None:
-        if gate not in self.gates.keys():
+        try:
+            func = self._gates[gate]
+        except KeyError:
             raise NotImplementedError(f'Gate {gate} it is not implemented in {self.__class__.__name__}')
-        self.gates[gate](*args)
+        func(*args)
     
     def measure(self, target: int, basis: int = Z_BASIS) -> int:
         raise NotImplemented('Unimplemented measure function')
     
+    def copy(self) -> 'Simulator':
+        # Independent simulator in the same state with the same gates and random source
+        raise NotImplementedError(f'{self.__class__.__name__} can not be copied')
+    
+    def reset(self, target: int) -> None:
+        # Returns target to |0>, backends with a cheaper native form override it
+        if self.measure(target):
+            self.apply_gate('x', target)
+    
+    def sample(self, targets: List[int], shots: int) -> Counter:
+        raise NotImplementedError(f'{self.__class__.__name__} does not support sampling')
+    
     def measure_all(self, basis: int = Z_BASIS) -> str:
         result = ''
         for i in range(self.nqubits):
             result = str(self.measure(i, basis)) + result
-        return result
\ No newline at end of file
+        return result
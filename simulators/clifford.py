@@ -1,7 +1,7 @@
 from typing import Set, Dict
 import numpy as np
+from functools import partial
 from itertools import combinations, product
-import random
 from .base import Simulator
 
 class GraphStateSimulator(Simulator):
@@ -346,6 +346,10 @@ class GraphStateSimulator(Simulator):
         super().__init__(nqubits)
 
         self.nqubits = nqubits
+        # Cost counters of the graph updates
+        self.local_complementations = 0
+        self.edge_toggles = 0
+        self.max_degree = 0
         self.vertices = list()
         for _ in range(nqubits):
             self.vertices.append(GraphStateSimulator.Vertex())
@@ -357,6 +361,8 @@ class GraphStateSimulator(Simulator):
             # Multiqubit gates
             'cx': self.CX, 'cy': self.CY, 'cz': self.CZ, 'swap': self.Swap
         }
+        for vop in range(24):
+            self._gates[vop_gate(vop)] = partial(self.apply_vop, vop=vop)
     
     @property
     def gates(self) -> Dict:
@@ -421,9 +427,23 @@ class GraphStateSimulator(Simulator):
         self.vertices[target].vop = vop_b
     
     def Swap(self, control: int, target: int) -> None:
-        self.CX(control, target)
-        self.CX(target, control)
-        self.CX(control, target)
+        # Exchanging two qubits only relabels their vertices, so the VOPs and neighbourhoods
+        # are swapped and every neighbour adjacent to just one of them follows the relabeling
+        assert (0 <= control < self.nqubits) and (0 <= target < self.nqubits), 'qubits out of range'
+        assert control != target, 'swap qubits must be different'
+        
+        a, b = self.vertices[control], self.vertices[target]
+        relabel = {control: target, target: control}
+        for n in (a.ngbh ^ b.ngbh) - {control, target}:
+            ngbh = self.vertices[n].ngbh
+            if control in ngbh:
+                ngbh.remove(control)
+                ngbh.add(target)
+            else:
+                ngbh.remove(target)
+                ngbh.add(control)
+        a.ngbh, b.ngbh = {relabel.get(v, v) for v in b.ngbh}, {relabel.get(v, v) for v in a.ngbh}
+        a.vop, b.vop = b.vop, a.vop
     
     def measure(self, target: int, basis: int = Simulator.Z_BASIS) -> int:
         assert 0 <= target < self.nqubits, 'qubit out of range'
@@ -431,7 +451,12 @@ class GraphStateSimulator(Simulator):
         vop_conjugate = GraphStateSimulator.CONJUGATION_TABLE[self.vertices[target].vop]
         bare_basis, phase = GraphStateSimulator.MEASURE_TABLE[basis, vop_conjugate]
 
-        eta = random.choice([0, 1])
+        # The outcome of an isolated vertex in its bare X basis is always 0, the others are drawn
+        if bare_basis == Simulator.X_BASIS and not self.vertices[target].has_neighbors():
+            eta = 0
+        else:
+            eta = self.random.choice([0, 1])
+            self.random_draws += 1
         if bare_basis == Simulator.X_BASIS:
             eta = self.measure_x(target, eta)
         elif bare_basis == Simulator.Y_BASIS:
@@ -444,11 +469,31 @@ class GraphStateSimulator(Simulator):
         
         return eta
     
+    def copy(self) -> 'GraphStateSimulator':
+        sim = GraphStateSimulator(self.nqubits)
+        for vertex, copied in zip(self.vertices, sim.vertices):
+            copied.vop = vertex.vop
+            copied.ngbh = vertex.ngbh.copy()
+        sim.local_complementations, sim.edge_toggles, sim.max_degree = self.local_complementations, self.edge_toggles, self.max_degree
+        sim.random = self.random
+        sim.random_draws = self.random_draws
+        return sim
+    
+    def reset(self, target: int) -> None:
+        # A Z measurement leaves the vertex isolated, so its VOP alone sets it to |0>
+        self.measure(target)
+        self.vertices[target].vop = 10
+    
+    def swap_partner(self, qubit_a: int, qubit_b: int) -> int:
+        # Any neighbour of a other than b works, the one with the lowest degree makes
+        # its local complementations the cheapest
+        return min(self.vertices[qubit_a].diff({qubit_b}), key=lambda v: len(self.vertices[v].ngbh))
+    
     def remove_vop(self, qubit_a: int, qubit_b: int) -> None:
         if self.vertices[qubit_a].is_unique_neighbor(qubit_b):
             c = qubit_b
         else:
-            c = self.vertices[qubit_a].diff({qubit_b}).pop()
+            c = self.swap_partner(qubit_a, qubit_b)
         
         d = GraphStateSimulator.DECOMPOSITION_LOOKUP_TABLE[self.vertices[qubit_a].vop]
         for v in reversed(d):
@@ -458,6 +503,7 @@ class GraphStateSimulator(Simulator):
                 self.local_complementation(c)
 
     def local_complementation(self, qubit: int) -> None:
+        self.local_complementations += 1
         ngbh = self.vertices[qubit].ngbh.copy()
 
         for i, j in combinations(ngbh, 2):
@@ -469,10 +515,13 @@ class GraphStateSimulator(Simulator):
     def add_edge(self, qubit_a: int, qubit_b: int) -> None:
         self.vertices[qubit_a].add_neighbor(qubit_b)
         self.vertices[qubit_b].add_neighbor(qubit_a)
+        self.edge_toggles += 1
+        self.max_degree = max(self.max_degree, len(self.vertices[qubit_a].ngbh), len(self.vertices[qubit_b].ngbh))
     
     def remove_edge(self, qubit_a: int, qubit_b: int) -> None:
         self.vertices[qubit_a].remove_neighbor(qubit_b)
         self.vertices[qubit_b].remove_neighbor(qubit_a)
+        self.edge_toggles += 1
     
     def toggle_edge(self, qubit_a: int, qubit_b: int) -> None:
         if self.has_edge(qubit_a, qubit_b):
@@ -500,6 +549,8 @@ class GraphStateSimulator(Simulator):
         
         for i, j in combinations(self.vertices[target].ngbh | {target}, 2):
             self.toggle_edge(i, j)
+        
+        return eta
     
     def measure_x(self, target: int, eta: int) -> int:
         if not self.vertices[target].has_neighbors():
@@ -569,4 +620,29 @@ class GraphStateSimulator(Simulator):
             return f'{self.vop}: {self.ngbh}'
         
         def __repr__(self) -> str:
-            return f'<Vertex object. VOP({self.vop}), Neighbors({self.ngbh})>'
\ No newline at end of file
+            return f'<Vertex object. VOP({self.vop}), Neighbors({self.ngbh})>'
+
+# Single-qubit gates as elements of the local Clifford group
+GATE_VOPS = {'i': 0, 'x': 1, 'y': 2, 'z': 3, 'h': 10, 's': 6, 'sdg': 5}
+VOP_NAMES = {vop: name for name, vop in GATE_VOPS.items()}
+# Elements that commute with Z, they can be moved through CZ and the control of CX
+DIAGONAL_VOPS = {0, 3, 5, 6}
+
+def vop_gate(vop: int) -> str:
+    # Name of the gate applying the local Clifford vop
+    return f'vop{vop}'
+
+def _vop_words():
+    # Shortest sequence of named gates for every element, found by a breadth-first
+    # search over the multiplication table
+    words = {0: ()}
+    queue = [0]
+    for vop in queue:
+        for gate in ['h', 's', 'sdg', 'x', 'y', 'z']:
+            nvop = int(GraphStateSimulator.LOCAL_CLIFFORD_GROUP[GATE_VOPS[gate], vop])
+            if nvop not in words:
+                words[nvop] = words[vop] + (gate, )
+                queue.append(nvop)
+    return [words[vop] for vop in range(24)]
+
+VOP_WORDS = _vop_words()
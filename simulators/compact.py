@@ -0,0 +1,300 @@
+from typing import Dict, Iterable, List
+from array import array
+from functools import partial
+from bisect import bisect_left, insort
+from itertools import combinations
+from .base import Simulator
+from .clifford import GraphStateSimulator, vop_gate
+
+# Group tables flattened into Python tuples, indexing them returns plain ints
+MULTIPLICATION_TABLE = tuple(GraphStateSimulator.LOCAL_CLIFFORD_GROUP.reshape(-1).tolist())
+CZ_TABLE = tuple(tuple(entry) for entry in GraphStateSimulator.CZ_TABLE.reshape(-1, 3).tolist())
+CONJUGATION_TABLE = tuple(GraphStateSimulator.CONJUGATION_TABLE.tolist())
+MEASURE_TABLE = tuple(tuple(entry) for entry in GraphStateSimulator.MEASURE_TABLE.reshape(-1, 2).tolist())
+DECOMPOSITION_TABLE = tuple(tuple(reversed(d)) for d in GraphStateSimulator.DECOMPOSITION_LOOKUP_TABLE)
+
+class CompactGraphStateSimulator(Simulator):
+    def __init__(self, nqubits: int) -> None:
+        super().__init__(nqubits)
+        
+        self.nqubits = nqubits
+        # Cost counters of the graph updates
+        self.local_complementations = 0
+        self.edge_toggles = 0
+        self.max_degree = 0
+        # One byte per qubit, every vertex starts as H|+> = |0>
+        self.vops = bytearray([10]) * nqubits
+        # Sorted neighbour arrays, isolated vertices have no entry at all
+        self.adjacency: Dict[int, array] = {}
+        self._gates = {
+            # Pauli gates
+            'i': self.I, 'x': self.X, 'y': self.Y, 'z': self.Z,
+            # Clifford gates
+            'h': self.H, 's': self.S, 'sdg': self.Sdg,
+            # Multiqubit gates
+            'cx': self.CX, 'cy': self.CY, 'cz': self.CZ, 'swap': self.Swap
+        }
+        for vop in range(24):
+            self._gates[vop_gate(vop)] = partial(self.apply_vop, vop=vop)
+    
+    def apply_vop(self, qubit: int, vop: int) -> None:
+        assert 0 <= qubit < self.nqubits, 'qubit out of range'
+        assert 0 <= vop < 24, 'unknown VOP operation'
+        self.vops[qubit] = MULTIPLICATION_TABLE[vop * 24 + self.vops[qubit]]
+    
+    def rapply_vop(self, qubit: int, vop: int) -> None:
+        self.vops[qubit] = MULTIPLICATION_TABLE[self.vops[qubit] * 24 + vop]
+    
+    def I(self, qubit: int) -> None:
+        self.apply_vop(qubit, 0)
+    
+    def X(self, qubit: int) -> None:
+        self.apply_vop(qubit, 1)
+    
+    def Y(self, qubit: int) -> None:
+        self.apply_vop(qubit, 2)
+    
+    def Z(self, qubit: int) -> None:
+        self.apply_vop(qubit, 3)
+    
+    def H(self, qubit: int) -> None:
+        self.apply_vop(qubit, 10)
+    
+    def S(self, qubit: int) -> None:
+        self.apply_vop(qubit, 6)
+    
+    def Sdg(self, qubit: int) -> None:
+        self.apply_vop(qubit, 5)
+    
+    def CX(self, control: int, target: int) -> None:
+        self.H(target)
+        self.CZ(control, target)
+        self.H(target)
+    
+    def CY(self, control: int, target: int) -> None:
+        self.S(target)
+        self.CX(control, target)
+        self.Sdg(target)
+    
+    def CZ(self, control: int, target: int) -> None:
+        assert (0 <= control < self.nqubits) and (0 <= target < self.nqubits), 'qubits out of range'
+        assert control != target, 'control qubit must be different from target qubit'
+        
+        if not self.is_unique_neighbor(control, target):
+            self.remove_vop(control, target)
+        if not self.is_unique_neighbor(target, control):
+            self.remove_vop(target, control)
+        if not self.is_unique_neighbor(control, target):
+            self.remove_vop(control, target)
+        
+        edge = 1 if self.has_edge(control, target) else 0
+        _edge, vop_a, vop_b = CZ_TABLE[(edge * 24 + self.vops[control]) * 24 + self.vops[target]]
+        
+        if edge != _edge:
+            self.toggle_edge(control, target)
+        self.vops[control] = vop_a
+        self.vops[target] = vop_b
+    
+    def Swap(self, control: int, target: int) -> None:
+        # Exchanging two qubits only relabels their vertices, see GraphStateSimulator.Swap
+        assert (0 <= control < self.nqubits) and (0 <= target < self.nqubits), 'qubits out of range'
+        assert control != target, 'swap qubits must be different'
+        
+        ngbh_a, ngbh_b = set(self.neighbors(control)), set(self.neighbors(target))
+        for n in (ngbh_a ^ ngbh_b) - {control, target}:
+            if n in ngbh_a:
+                self._remove(n, control)
+                self._insert(n, target)
+            else:
+                self._remove(n, target)
+                self._insert(n, control)
+        
+        relabel = {control: target, target: control}
+        for v, ngbh in ((control, ngbh_b), (target, ngbh_a)):
+            if ngbh:
+                self.adjacency[v] = array('I', sorted(relabel.get(u, u) for u in ngbh))
+            elif v in self.adjacency:
+                del self.adjacency[v]
+        self.vops[control], self.vops[target] = self.vops[target], self.vops[control]
+    
+    def measure(self, target: int, basis: int = Simulator.Z_BASIS) -> int:
+        assert 0 <= target < self.nqubits, 'qubit out of range'
+        
+        bare_basis, phase = MEASURE_TABLE[basis * 24 + CONJUGATION_TABLE[self.vops[target]]]
+        
+        # Drawn unless the vertex is isolated in its bare X basis, see GraphStateSimulator.measure
+        if bare_basis == Simulator.X_BASIS and target not in self.adjacency:
+            eta = 0
+        else:
+            eta = self.random.getrandbits(1)
+            self.random_draws += 1
+        if bare_basis == Simulator.X_BASIS:
+            eta = self.measure_x(target, eta)
+        elif bare_basis == Simulator.Y_BASIS:
+            eta = self.measure_y(target, eta)
+        elif bare_basis == Simulator.Z_BASIS:
+            eta = self.measure_z(target, eta)
+        
+        if phase == -1:
+            eta = 1 if eta == 0 else 0
+        
+        return eta
+    
+    def copy(self) -> 'CompactGraphStateSimulator':
+        sim = CompactGraphStateSimulator(self.nqubits)
+        sim.vops = self.vops[:]
+        sim.adjacency = {v: ngbh[:] for v, ngbh in self.adjacency.items()}
+        sim.local_complementations, sim.edge_toggles, sim.max_degree = self.local_complementations, self.edge_toggles, self.max_degree
+        sim.random = self.random
+        sim.random_draws = self.random_draws
+        return sim
+    
+    def reset(self, target: int) -> None:
+        # A Z measurement leaves the vertex isolated, so its VOP alone sets it to |0>
+        self.measure(target)
+        self.vops[target] = 10
+    
+    def neighbors(self, qubit: int) -> Iterable[int]:
+        return self.adjacency.get(qubit, ())
+    
+    def degree(self, qubit: int) -> int:
+        return len(self.adjacency.get(qubit, ()))
+    
+    def is_unique_neighbor(self, qubit_a: int, qubit_b: int) -> bool:
+        ngbh = self.adjacency.get(qubit_a)
+        return ngbh is None or (len(ngbh) == 1 and ngbh[0] == qubit_b)
+    
+    def swap_partner(self, qubit_a: int, qubit_b: int) -> int:
+        # Any neighbour of a other than b works, the one with the lowest degree makes
+        # its local complementations the cheapest
+        return min((v for v in self.adjacency[qubit_a] if v != qubit_b), key=self.degree)
+    
+    def remove_vop(self, qubit_a: int, qubit_b: int) -> None:
+        if self.is_unique_neighbor(qubit_a, qubit_b):
+            c = qubit_b
+        else:
+            c = self.swap_partner(qubit_a, qubit_b)
+        
+        for v in DECOMPOSITION_TABLE[self.vops[qubit_a]]:
+            if v == 0:
+                self.local_complementation(qubit_a)
+            else:
+                self.local_complementation(c)
+    
+    def local_complementation(self, qubit: int) -> None:
+        self.local_complementations += 1
+        ngbh = list(self.neighbors(qubit))
+        
+        self.toggle_edges(combinations(ngbh, 2))
+        for i in ngbh:
+            self.rapply_vop(i, 6)
+        self.rapply_vop(qubit, 14)
+    
+    def has_edge(self, qubit_a: int, qubit_b: int) -> bool:
+        ngbh = self.adjacency.get(qubit_a)
+        if ngbh is None:
+            return False
+        i = bisect_left(ngbh, qubit_b)
+        return i < len(ngbh) and ngbh[i] == qubit_b
+    
+    def _insert(self, qubit_a: int, qubit_b: int) -> None:
+        ngbh = self.adjacency.get(qubit_a)
+        if ngbh is None:
+            self.adjacency[qubit_a] = array('I', (qubit_b, ))
+            self.max_degree = max(self.max_degree, 1)
+        else:
+            insort(ngbh, qubit_b)
+            self.max_degree = max(self.max_degree, len(ngbh))
+    
+    def _remove(self, qubit_a: int, qubit_b: int) -> None:
+        ngbh = self.adjacency[qubit_a]
+        if len(ngbh) == 1:
+            del self.adjacency[qubit_a]
+        else:
+            ngbh.pop(bisect_left(ngbh, qubit_b))
+    
+    def add_edge(self, qubit_a: int, qubit_b: int) -> None:
+        self._insert(qubit_a, qubit_b)
+        self._insert(qubit_b, qubit_a)
+        self.edge_toggles += 1
+    
+    def remove_edge(self, qubit_a: int, qubit_b: int) -> None:
+        self._remove(qubit_a, qubit_b)
+        self._remove(qubit_b, qubit_a)
+        self.edge_toggles += 1
+    
+    def toggle_edge(self, qubit_a: int, qubit_b: int) -> None:
+        if self.has_edge(qubit_a, qubit_b):
+            self.remove_edge(qubit_a, qubit_b)
+        else:
+            self.add_edge(qubit_a, qubit_b)
+    
+    def toggle_edges(self, edges: Iterable) -> None:
+        # Collects every toggle per vertex and rebuilds each touched neighbour array once
+        toggles = {}
+        for i, j in edges:
+            toggles.setdefault(i, set()).symmetric_difference_update((j, ))
+            toggles.setdefault(j, set()).symmetric_difference_update((i, ))
+        
+        # Every toggled edge shows up in the changes of both of its ends
+        self.edge_toggles += sum(len(changes) for changes in toggles.values()) // 2
+        for v, changes in toggles.items():
+            ngbh = changes.symmetric_difference(self.adjacency.get(v, ()))
+            if ngbh:
+                self.adjacency[v] = array('I', sorted(ngbh))
+                self.max_degree = max(self.max_degree, len(ngbh))
+            elif v in self.adjacency:
+                del self.adjacency[v]
+    
+    def measure_z(self, target: int, eta: int) -> int:
+        for n in list(self.neighbors(target)):
+            self.remove_edge(target, n)
+            if eta == 1:
+                self.rapply_vop(n, 3)
+        if eta == 1:
+            self.rapply_vop(target, 1)
+        self.rapply_vop(target, 10)
+        
+        return eta
+    
+    def measure_y(self, target: int, eta: int) -> int:
+        ngbh = list(self.neighbors(target)) + [target]
+        for n in ngbh:
+            self.rapply_vop(n, 5 if eta == 1 else 6)
+        
+        self.toggle_edges(combinations(ngbh, 2))
+        
+        return eta
+    
+    def measure_x(self, target: int, eta: int) -> int:
+        if target not in self.adjacency:
+            return 0
+        b = self.adjacency[target][0]
+        ngbh_a = set(self.adjacency[target])
+        ngbh_b = set(self.adjacency[b])
+        
+        if eta == 1:
+            self.rapply_vop(target, 3)
+            self.rapply_vop(b, 9)
+            
+            for n in ngbh_b - ngbh_a - {target}:
+                self.rapply_vop(n, 3)
+        else:
+            self.rapply_vop(b, 11)
+            for n in ngbh_a - ngbh_b - {b}:
+                self.rapply_vop(n, 3)
+        
+        edges: List = []
+        toggled = set()
+        for i in ngbh_a:
+            for j in ngbh_b:
+                if i == j or (i, j) in toggled:
+                    continue
+                toggled.add((i, j))
+                toggled.add((j, i))
+                edges.append((i, j))
+        edges.extend(combinations(ngbh_a & ngbh_b, 2))
+        edges.extend((b, d) for d in ngbh_a - {b})
+        self.toggle_edges(edges)
+        
+        return eta
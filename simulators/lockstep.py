@@ -0,0 +1,294 @@
+import numpy as np
+from typing import Tuple
+from functools import partial
+from .base import Simulator
+from .clifford import GraphStateSimulator, vop_gate
+from .compact import DECOMPOSITION_TABLE
+
+# Group tables as arrays, so a lookup indexed by arrays updates every group at once
+MULTIPLICATION_TABLE = GraphStateSimulator.LOCAL_CLIFFORD_GROUP.astype(np.uint8)
+CZ_TABLE = GraphStateSimulator.CZ_TABLE.astype(np.uint8)
+CONJUGATION_TABLE = GraphStateSimulator.CONJUGATION_TABLE.astype(np.uint8)
+MEASURE_TABLE = GraphStateSimulator.MEASURE_TABLE
+# Local complementations of every decomposition, padded with -1
+DECOMPOSITION_STEPS = np.array([d + (-1, ) * (5 - len(d)) for d in DECOMPOSITION_TABLE], dtype=np.int8)
+
+def _bits(vertices: np.ndarray) -> np.ndarray:
+    # Bit of every vertex inside its word of an adjacency bitset
+    return np.uint64(1) << (vertices & 63).astype(np.uint64)
+
+class LockstepGraphStateSimulator(Simulator):
+    # Graph states of many shots advanced together. Shots that went through the same
+    # measurement outcomes are in the same state, so they are kept in groups, each with a
+    # row of VOPs and a bitset of neighbours per vertex, and a measurement splits every
+    # group by the outcomes drawn for its shots. Every graph update is applied to all the
+    # groups it concerns at once, VOPs through lookups into the group tables indexed by
+    # arrays and neighbourhoods through XORs of bitsets.
+    LOCKSTEP = True
+    
+    def __init__(self, nqubits: int, shots: int = 1) -> None:
+        super().__init__(nqubits)
+        assert shots > 0, 'shots must be greater than 0'
+        
+        self.nqubits = nqubits
+        self.shots = shots
+        self.words = -(-nqubits // 64)
+        # Group of every shot
+        self.group = np.zeros(shots, dtype=np.int64)
+        # VOPs of every group, every vertex starts as H|+> = |0>
+        self.vops = np.full((1, nqubits), 10, dtype=np.uint8)
+        # Neighbours of every vertex of every group, vertex v in bit v % 64 of word v // 64
+        self.adjacency = np.zeros((1, nqubits, self.words), dtype=np.uint64)
+        # Groups the gates act on, all of them unless apply_where selected some
+        self.rows = slice(None)
+        self._gates = {
+            # Pauli gates
+            'i': self.I, 'x': self.X, 'y': self.Y, 'z': self.Z,
+            # Clifford gates
+            'h': self.H, 's': self.S, 'sdg': self.Sdg,
+            # Multiqubit gates
+            'cx': self.CX, 'cy': self.CY, 'cz': self.CZ, 'swap': self.Swap
+        }
+        for vop in range(24):
+            self._gates[vop_gate(vop)] = partial(self.apply_vop, vop=vop)
+    
+    @property
+    def groups(self) -> int:
+        return len(self.vops)
+    
+    def apply_vop(self, qubit: int, vop: int) -> None:
+        assert 0 <= qubit < self.nqubits, 'qubit out of range'
+        assert 0 <= vop < 24, 'unknown VOP operation'
+        self.vops[self.rows, qubit] = MULTIPLICATION_TABLE[vop, self.vops[self.rows, qubit]]
+    
+    def I(self, qubit: int) -> None:
+        self.apply_vop(qubit, 0)
+    
+    def X(self, qubit: int) -> None:
+        self.apply_vop(qubit, 1)
+    
+    def Y(self, qubit: int) -> None:
+        self.apply_vop(qubit, 2)
+    
+    def Z(self, qubit: int) -> None:
+        self.apply_vop(qubit, 3)
+    
+    def H(self, qubit: int) -> None:
+        self.apply_vop(qubit, 10)
+    
+    def S(self, qubit: int) -> None:
+        self.apply_vop(qubit, 6)
+    
+    def Sdg(self, qubit: int) -> None:
+        self.apply_vop(qubit, 5)
+    
+    def CX(self, control: int, target: int) -> None:
+        self.H(target)
+        self.CZ(control, target)
+        self.H(target)
+    
+    def CY(self, control: int, target: int) -> None:
+        self.S(target)
+        self.CX(control, target)
+        self.Sdg(target)
+    
+    def CZ(self, control: int, target: int) -> None:
+        assert (0 <= control < self.nqubits) and (0 <= target < self.nqubits), 'qubits out of range'
+        assert control != target, 'control qubit must be different from target qubit'
+        
+        rows = np.arange(self.groups)[self.rows]
+        # VOPs are removed first in the groups where a vertex has other neighbours, as in GraphStateSimulator.CZ
+        for qubit_a, qubit_b in ((control, target), (target, control), (control, target)):
+            blocked = rows[~self._unique_neighbors(rows, qubit_a, qubit_b)]
+            if len(blocked):
+                self.remove_vop(blocked, qubit_a, qubit_b)
+        
+        edge = self._edges(rows, control, target)
+        entry = CZ_TABLE[edge, self.vops[rows, control], self.vops[rows, target]]
+        self._toggle(rows[entry[:, 0] != edge], control, target)
+        self.vops[rows, control] = entry[:, 1]
+        self.vops[rows, target] = entry[:, 2]
+    
+    def Swap(self, control: int, target: int) -> None:
+        # Relabels the two vertices in every selected group: their bits are exchanged in
+        # every neighbourhood, then their neighbourhoods and VOPs
+        assert (0 <= control < self.nqubits) and (0 <= target < self.nqubits), 'qubits out of range'
+        assert control != target, 'swap qubits must be different'
+        
+        rows = np.arange(self.groups)[self.rows]
+        shift_a, shift_b = np.uint64(control & 63), np.uint64(target & 63)
+        adjacency = self.adjacency[rows]
+        differ = ((adjacency[:, :, control >> 6] >> shift_a) ^ (adjacency[:, :, target >> 6] >> shift_b)) & np.uint64(1)
+        adjacency[:, :, control >> 6] ^= differ << shift_a
+        adjacency[:, :, target >> 6] ^= differ << shift_b
+        adjacency[:, [control, target]] = adjacency[:, [target, control]]
+        self.adjacency[rows] = adjacency
+        self.vops[rows, control], self.vops[rows, target] = self.vops[rows, target], self.vops[rows, control]
+    
+    def apply_where(self, taken: np.ndarray, gate: str, *qubits) -> None:
+        # Applies gate in the shots where taken is set only, after splitting them off their groups
+        _, flags = self.split(taken)
+        self.rows = np.flatnonzero(flags)
+        try:
+            self.apply_gate(gate, *qubits)
+        finally:
+            self.rows = slice(None)
+    
+    def split(self, flags: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Separates the shots of every group by their flag and returns, for every new
+        # group, the group it was copied from and the flag of its shots
+        keys, self.group = np.unique(self.group * 2 + flags, return_inverse=True)
+        parents = keys >> 1
+        # Every group keeps at least one shot, so the groups only change when there are more keys
+        if len(keys) > self.groups:
+            self.vops = self.vops[parents]
+            self.adjacency = self.adjacency[parents]
+        return parents, keys & 1
+    
+    def random_bits(self) -> np.ndarray:
+        # One random bit per shot from the random source of the backend
+        value = self.random.getrandbits(self.shots)
+        data = np.frombuffer(value.to_bytes(-(-self.shots // 8), 'little'), dtype=np.uint8)
+        return np.unpackbits(data, count=self.shots, bitorder='little').astype(np.int64)
+    
+    def measure(self, target: int, basis: int = Simulator.Z_BASIS) -> np.ndarray:
+        # Outcome of every shot
+        assert 0 <= target < self.nqubits, 'qubit out of range'
+        
+        bare_basis, phase = MEASURE_TABLE[basis, CONJUGATION_TABLE[self.vops[:, target]]].T
+        # An isolated vertex measured in its bare X basis always gives 0
+        drawn = ~((bare_basis == Simulator.X_BASIS) & ~self.adjacency[:, target].any(axis=1))
+        flags = np.zeros(self.shots, dtype=np.int64)
+        if drawn.any():
+            self.random_draws += 1
+            flags = self.random_bits() * drawn[self.group]
+        parents, eta = self.split(flags)
+        bare_basis, phase, drawn = bare_basis[parents], phase[parents], drawn[parents]
+        
+        for measure, rows in ((self.measure_z, bare_basis == Simulator.Z_BASIS), (self.measure_y, bare_basis == Simulator.Y_BASIS), (self.measure_x, (bare_basis == Simulator.X_BASIS) & drawn)):
+            rows = np.flatnonzero(rows)
+            if len(rows):
+                measure(rows, target, eta[rows])
+        
+        return (eta ^ (phase == -1)).astype(np.uint8)[self.group]
+    
+    def copy(self) -> 'LockstepGraphStateSimulator':
+        sim = LockstepGraphStateSimulator(self.nqubits, self.shots)
+        sim.group, sim.vops, sim.adjacency = self.group.copy(), self.vops.copy(), self.adjacency.copy()
+        sim.random = self.random
+        sim.random_draws = self.random_draws
+        return sim
+    
+    def reset(self, target: int) -> None:
+        # A Z measurement leaves the vertex isolated in every group, so its VOP alone sets it to |0>
+        self.measure(target)
+        self.vops[:, target] = 10
+    
+    def _unpack(self, masks: np.ndarray) -> np.ndarray:
+        # Bitsets as rows of one byte per vertex
+        return np.unpackbits(np.ascontiguousarray(masks).view(np.uint8), axis=-1, count=self.nqubits, bitorder='little')
+    
+    @staticmethod
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        return np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int64)
+    
+    def _unique_neighbors(self, rows: np.ndarray, qubit_a: int, qubit_b: int) -> np.ndarray:
+        # Groups where a has no neighbour other than b
+        ngbh = self.adjacency[rows, qubit_a]
+        ngbh[:, qubit_b >> 6] &= ~_bits(np.int64(qubit_b))
+        return ~ngbh.any(axis=1)
+    
+    def _edges(self, rows: np.ndarray, qubit_a: int, qubit_b: int) -> np.ndarray:
+        return ((self.adjacency[rows, qubit_a, qubit_b >> 6] >> np.uint64(qubit_b & 63)) & np.uint64(1)).astype(np.intp)
+    
+    def _toggle(self, rows: np.ndarray, qubit_a: int, qubit_b: int) -> None:
+        self.adjacency[rows, qubit_a, qubit_b >> 6] ^= _bits(np.int64(qubit_b))
+        self.adjacency[rows, qubit_b, qubit_a >> 6] ^= _bits(np.int64(qubit_a))
+    
+    def rapply_vop(self, rows: np.ndarray, qubits, vop) -> None:
+        self.vops[rows, qubits] = MULTIPLICATION_TABLE[self.vops[rows, qubits], vop]
+    
+    def rapply_vops(self, rows: np.ndarray, bits: np.ndarray, vop) -> None:
+        # Right-multiplies every vertex whose bit is set in the row of its group
+        vops = self.vops[rows]
+        self.vops[rows] = np.where(bits == 1, MULTIPLICATION_TABLE[vops, np.reshape(vop, (-1, 1))], vops)
+    
+    def swap_partners(self, rows: np.ndarray, qubit_a: int, qubit_b: int) -> np.ndarray:
+        # Neighbour of a other than b with the lowest degree in every group, see
+        # CompactGraphStateSimulator.swap_partner
+        candidates = self._unpack(self.adjacency[rows, qubit_a])
+        candidates[:, qubit_b] = 0
+        verts = np.flatnonzero(candidates.any(axis=0))
+        degrees = self._popcount(self.adjacency[rows[:, None], verts])
+        return verts[np.argmin(np.where(candidates[:, verts] == 1, degrees, self.nqubits), axis=1)]
+    
+    def remove_vop(self, rows: np.ndarray, qubit_a: int, qubit_b: int) -> None:
+        # Groups where a has neighbours other than b, the decompositions of their VOPs
+        # are walked one step at a time
+        partners = self.swap_partners(rows, qubit_a, qubit_b)
+        for step in DECOMPOSITION_STEPS[self.vops[rows, qubit_a]].T:
+            chosen = step >= 0
+            if not chosen.any():
+                break
+            self.local_complementation(rows[chosen], np.where(step[chosen] == 0, qubit_a, partners[chosen]))
+    
+    def local_complementation(self, rows: np.ndarray, qubits: np.ndarray) -> None:
+        masks = self.adjacency[rows, qubits]
+        bits = self._unpack(masks)
+        self.complement(rows, masks, bits)
+        self.rapply_vops(rows, bits, 6)
+        self.rapply_vop(rows, qubits, 14)
+    
+    def complement(self, rows: np.ndarray, masks: np.ndarray, bits: np.ndarray) -> None:
+        # Toggles every edge between two vertices of the mask of each group, with one XOR per vertex
+        verts = np.flatnonzero(bits.any(axis=0))
+        self.adjacency[rows[:, None], verts] ^= np.where(bits[:, verts, None] == 1, masks[:, None], np.uint64(0))
+        # The mask holds every vertex itself as well
+        k, v = np.nonzero(bits)
+        self.adjacency[rows[k], v, v >> 6] ^= _bits(v)
+    
+    def measure_z(self, rows: np.ndarray, target: int, eta: np.ndarray) -> None:
+        self.rapply_vops(rows, self._unpack(self.adjacency[rows, target]) & eta[:, None].astype(np.uint8), 3)
+        self.adjacency[rows, :, target >> 6] &= ~_bits(np.int64(target))
+        self.adjacency[rows, target] = 0
+        self.rapply_vop(rows, target, np.where(eta == 1, 1, 0))
+        self.rapply_vop(rows, target, 10)
+    
+    def measure_y(self, rows: np.ndarray, target: int, eta: np.ndarray) -> None:
+        masks = self.adjacency[rows, target]
+        masks[:, target >> 6] |= _bits(np.int64(target))
+        bits = self._unpack(masks)
+        self.rapply_vops(rows, bits, np.where(eta == 1, 5, 6))
+        self.complement(rows, masks, bits)
+    
+    def measure_x(self, rows: np.ndarray, target: int, eta: np.ndarray) -> None:
+        # Groups where target has neighbours, b is its lowest neighbour in each
+        k = np.arange(len(rows))
+        ngbh_a = self.adjacency[rows, target]
+        bits_a = self._unpack(ngbh_a)
+        b = np.argmax(bits_a, axis=1)
+        ngbh_b = self.adjacency[rows, b]
+        bits_b = self._unpack(ngbh_b)
+        
+        flip = eta == 1
+        only = np.where(flip[:, None], bits_b & ~bits_a, bits_a & ~bits_b)
+        only[flip, target] = 0
+        only[k[~flip], b[~flip]] = 0
+        self.rapply_vops(rows, only, 3)
+        self.rapply_vop(rows[flip], target, 3)
+        self.rapply_vop(rows, b, np.where(flip, 9, 11))
+        
+        # Pairs of a neighbour of target and one of b, pairs of common neighbours, and b
+        # with every other neighbour of target, as rows of toggles of the vertices involved
+        zero = np.uint64(0)
+        verts = np.flatnonzero((bits_a | bits_b).any(axis=0))
+        in_a, in_b = bits_a[:, verts, None] == 1, bits_b[:, verts, None] == 1
+        mask_b = np.zeros_like(ngbh_a)
+        mask_b[k, b >> 6] = _bits(b)
+        toggles = np.where(in_a, ngbh_b[:, None], zero) | np.where(in_b, ngbh_a[:, None], zero)
+        toggles ^= np.where(in_a & in_b, (ngbh_a & ngbh_b)[:, None], zero)
+        toggles ^= np.where(in_a, mask_b[:, None], zero)
+        toggles[k, np.searchsorted(verts, b)] ^= ngbh_a
+        # No vertex is paired with itself
+        toggles[:, np.arange(len(verts)), verts >> 6] &= ~_bits(verts)
+        self.adjacency[rows[:, None], verts] ^= toggles
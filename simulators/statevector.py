@@ -1,112 +1,286 @@
 import numpy as np
+from collections import Counter
+from functools import partial
+from enum import Enum
+from typing import Dict, List
 from numpy import linalg
-from functools import reduce
 from .base import Simulator
+from .clifford import VOP_WORDS, vop_gate
+
+GateKind = Enum('GateKind', ['DIAGONAL', 'PERMUTATION', 'DENSE'])
+
+CLIFFORD_MATRICES = {
+    'h': np.array([[1, 1], [1, -1]]) / np.sqrt(2), 's': np.diag([1, 1.j]), 'sdg': np.diag([1, -1.j]),
+    'x': np.array([[0, 1], [1, 0]]), 'y': np.array([[0, -1.j], [1.j, 0]]), 'z': np.diag([1, -1])
+}
+
+def _vop_matrix(word) -> np.ndarray:
+    matrix = np.eye(2, dtype=complex)
+    for gate in word:
+        matrix = CLIFFORD_MATRICES[gate] @ matrix
+    return matrix
+
+def _structure(matrix: np.ndarray) -> GateKind:
+    if matrix[0, 1] == 0 and matrix[1, 0] == 0:
+        return GateKind.DIAGONAL
+    if matrix[0, 0] == 0 and matrix[1, 1] == 0:
+        return GateKind.PERMUTATION
+    return GateKind.DENSE
+
+# Matrices of the local Clifford group, multiplied out from the gate sequences
+VOP_MATRICES = [_vop_matrix(word) for word in VOP_WORDS]
+# Matrix of every gate on its target, controlled gates apply it where the control is |1>
+GATE_MATRICES = {
+    **CLIFFORD_MATRICES, 'i': np.eye(2), 't': np.diag([1, np.exp(1.j * np.pi / 4)]),
+    'cx': CLIFFORD_MATRICES['x'], 'cy': CLIFFORD_MATRICES['y'], 'cz': CLIFFORD_MATRICES['z'],
+    **{vop_gate(vop): matrix for vop, matrix in enumerate(VOP_MATRICES)}
+}
 
 class StatevectorSimulator(Simulator):
+    SUPPORTS_SAMPLING = True
+    # Relative probability under which a measurement outcome is taken as impossible
+    ROUNDING = 1e-12
+    
+    # Structure of every gate: diagonal gates only multiply phases, permutations only
+    # exchange amplitudes and dense gates need the full 2x2 contraction. Swap exchanges two
+    # qubits and has a kernel of its own.
+    STRUCTURE = {
+        'i': GateKind.DIAGONAL, 'x': GateKind.PERMUTATION, 'y': GateKind.PERMUTATION, 'z': GateKind.DIAGONAL,
+        'h': GateKind.DENSE, 's': GateKind.DIAGONAL, 'sdg': GateKind.DIAGONAL, 't': GateKind.DIAGONAL,
+        'cx': GateKind.PERMUTATION, 'cy': GateKind.PERMUTATION, 'cz': GateKind.DIAGONAL
+    }
+    STRUCTURE.update({vop_gate(vop): _structure(matrix) for vop, matrix in enumerate(VOP_MATRICES)})
+    
     def __init__(self, nqubits: int) -> None:
         super().__init__(nqubits)
         self.nqubits = nqubits
         self.qstate = np.zeros(2 ** nqubits, dtype=complex)
         self.qstate[0] = complex(1.0, 0.0)
+        # Matrices of the gates added with add_unitary
+        self.unitaries: Dict[str, np.ndarray] = {}
+        # Kernel of every gate picked from its structure, called with the target and the control
+        self._kernels = {name: self._kernel(self.STRUCTURE[name], matrix) for name, matrix in GATE_MATRICES.items()}
+        self._vop_kernels = [self._kernels[vop_gate(vop)] for vop in range(24)]
         self._gates = {
             # Pauli gates
             'i': self.I, 'x': self.X, 'y': self.Y, 'z': self.Z,
             # Clifford gates
             'h': self.H, 's': self.S, 'sdg': self.Sdg,
+            # Non-Clifford gates
+            't': self.T,
             # Multiqubit gates
             'cx': self.CX, 'cy': self.CY, 'cz': self.CZ, 'swap': self.Swap
         }
+        for vop in range(24):
+            self._gates[vop_gate(vop)] = self._vop_kernels[vop]
     
     def __len__(self):
         return 2 ** self.nqubits
-
+    
     def __getitem__(self, idx) -> complex:
         return self.qstate[idx]
     
-    def _apply(self, gates: np.ndarray) -> None:
-        self.qstate = gates @ self.qstate
+    def _tensor(self) -> np.ndarray:
+        # View of the state with one axis per qubit (qubit 0 is the most significant)
+        return self.qstate.reshape((2,) * self.nqubits)
+    
+    @staticmethod
+    def _axis_slices(ndim: int, axis: int):
+        idx_0 = [slice(None)] * ndim
+        idx_1 = [slice(None)] * ndim
+        idx_0[axis] = 0
+        idx_1[axis] = 1
+        return tuple(idx_0), tuple(idx_1)
+    
+    @staticmethod
+    def _contract(gate: np.ndarray, psi: np.ndarray, axis: int) -> None:
+        idx_0, idx_1 = StatevectorSimulator._axis_slices(psi.ndim, axis)
+        amp_0 = psi[idx_0].copy()
+        amp_1 = psi[idx_1]
+        psi[idx_0] = gate[0, 0] * amp_0 + gate[0, 1] * amp_1
+        psi[idx_1] = gate[1, 0] * amp_0 + gate[1, 1] * amp_1
     
     def _apply_unitary(self, gate: np.ndarray, qubit: int) -> None:
         assert 0 <= qubit < self.nqubits, 'qubit out of range'
-        
-        gates = [np.array([[1, 0],[0 ,1]])] * self.nqubits
-        gates[qubit] = gate
-        self._apply(reduce(np.kron, gates))
+        self._contract(gate, self._tensor(), qubit)
+    
+    def _control_view(self, control: int, target: int):
+        # Slice of the state where the control qubit is |1>, together with the target axis inside it
+        _, idx_1 = self._axis_slices(self.nqubits, control)
+        return self._tensor()[idx_1], target - 1 if target > control else target
     
     def _apply_controlled(self, gate: np.ndarray, control: int, target: int) -> None:
         assert (0 <= control < self.nqubits) and (0 <= target < self.nqubits), 'qubits out of range'
         assert control != target, 'control qubit must be different from target qubit'
-
-        gates_00 = [np.array([[1, 0],[0 ,1]])] * self.nqubits
-        gates_11 = [np.array([[1, 0],[0 ,1]])] * self.nqubits
-        gates_00[control] = np.array([[1, 0], [0, 0]])
-        gates_11[control] = np.array([[0, 0], [0, 1]])
-        gates_11[target] = gate
-
-        self._apply(reduce(np.kron, gates_00) + reduce(np.kron, gates_11))
+        
+        psi, axis = self._control_view(control, target)
+        self._contract(gate, psi, axis)
+    
+    def _apply_dense(self, gate: np.ndarray, target: int, control: int = -1) -> None:
+        if control == -1:
+            self._apply_unitary(gate, target)
+        else:
+            self._apply_controlled(gate, control, target)
+    
+    def _target_view(self, target: int, control: int = -1):
+        if control == -1:
+            assert 0 <= target < self.nqubits, 'qubit out of range'
+            return self._tensor(), target
+        assert (0 <= control < self.nqubits) and (0 <= target < self.nqubits), 'qubits out of range'
+        assert control != target, 'control qubit must be different from target qubit'
+        return self._control_view(control, target)
+    
+    def _apply_diagonal(self, phase_0: complex, phase_1: complex, target: int, control: int = -1) -> None:
+        psi, axis = self._target_view(target, control)
+        idx_0, idx_1 = self._axis_slices(psi.ndim, axis)
+        if phase_0 != 1:
+            psi[idx_0] *= phase_0
+        if phase_1 != 1:
+            psi[idx_1] *= phase_1
+    
+    def _apply_permutation(self, phase_0: complex, phase_1: complex, target: int, control: int = -1) -> None:
+        # Exchanges the |0> and |1> amplitudes of the target: |0> -> phase_1 |1>, |1> -> phase_0 |0>
+        psi, axis = self._target_view(target, control)
+        idx_0, idx_1 = self._axis_slices(psi.ndim, axis)
+        amp_0 = psi[idx_0].copy()
+        psi[idx_0] = psi[idx_1]
+        psi[idx_1] = amp_0
+        if phase_0 != 1:
+            psi[idx_0] *= phase_0
+        if phase_1 != 1:
+            psi[idx_1] *= phase_1
+    
+    def _apply_swap(self, qubit_a: int, qubit_b: int) -> None:
+        assert (0 <= qubit_a < self.nqubits) and (0 <= qubit_b < self.nqubits), 'qubits out of range'
+        assert qubit_a != qubit_b, 'swap qubits must be different'
+        
+        idx_01 = [slice(None)] * self.nqubits
+        idx_10 = [slice(None)] * self.nqubits
+        idx_01[qubit_a], idx_01[qubit_b] = 0, 1
+        idx_10[qubit_a], idx_10[qubit_b] = 1, 0
+        idx_01, idx_10 = tuple(idx_01), tuple(idx_10)
+        
+        psi = self._tensor()
+        amp_01 = psi[idx_01].copy()
+        psi[idx_01] = psi[idx_10]
+        psi[idx_10] = amp_01
+    
+    def _kernel(self, kind: GateKind, matrix: np.ndarray):
+        if kind == GateKind.DIAGONAL:
+            return partial(self._apply_diagonal, matrix[0, 0], matrix[1, 1])
+        if kind == GateKind.PERMUTATION:
+            return partial(self._apply_permutation, matrix[0, 1], matrix[1, 0])
+        return partial(self._apply_dense, matrix)
     
     def I(self, qubit: int) -> None:
-        self._apply_unitary(np.array([[1, 0], [0, 1]]), qubit)
+        self._kernels['i'](qubit)
     
     def X(self, qubit: int) -> None:
-        self._apply_unitary(np.array([[0, 1], [1, 0]]), qubit)
+        self._kernels['x'](qubit)
     
     def Y(self, qubit: int) -> None:
-        self._apply_unitary(np.array([[0, -1.j], [1.j, 0]]), qubit)
+        self._kernels['y'](qubit)
     
     def Z(self, qubit: int) -> None:
-        self._apply_unitary(np.array([[1, 0], [0, -1]]), qubit)
+        self._kernels['z'](qubit)
     
     def H(self, qubit: int) -> None:
-        self._apply_unitary((1/np.sqrt(2)) * np.array([[1, 1], [1, -1]]), qubit)
+        self._kernels['h'](qubit)
     
     def S(self, qubit: int) -> None:
-        self._apply_unitary(np.array([[1, 0], [0, 1.j]]), qubit)
+        self._kernels['s'](qubit)
     
     def Sdg(self, qubit: int) -> None:
-        self._apply_unitary(np.array([[1, 0], [0, -1.j]]), qubit)
+        self._kernels['sdg'](qubit)
+    
+    def T(self, qubit: int) -> None:
+        self._kernels['t'](qubit)
+    
+    def add_unitary(self, name: str, matrix: np.ndarray) -> None:
+        self.unitaries[name] = matrix
+        self._gates[name] = partial(self._apply_unitary, matrix)
+    
+    def copy(self) -> 'StatevectorSimulator':
+        sim = StatevectorSimulator(self.nqubits)
+        sim.qstate = self.qstate.copy()
+        for name, matrix in self.unitaries.items():
+            sim.add_unitary(name, matrix)
+        sim.random = self.random
+        sim.random_draws = self.random_draws
+        return sim
+    
+    def apply_vop(self, qubit: int, vop: int) -> None:
+        self._vop_kernels[vop](qubit)
     
     def CX(self, control: int, target: int) -> None:
-        self._apply_controlled(np.array([[0, 1], [1, 0]]), control, target)
+        self._kernels['cx'](target, control)
     
     def CY(self, control: int, target: int) -> None:
-        self._apply_controlled(np.array([[0, -1.j], [1.j, 0]]), control, target)
+        self._kernels['cy'](target, control)
     
     def CZ(self, control: int, target: int) -> None:
-        self._apply_controlled(np.array([[1, 0], [0, -1]]), control, target)
+        self._kernels['cz'](target, control)
     
     def Swap(self, control: int, target: int) -> None:
-        self.CX(control, target)
-        self.CX(target, control)
-        self.CX(control, target)
+        self._apply_swap(control, target)
     
     def _measure_z(self, target: int) -> int:
-        step_size = len(self) // 2 ** (target + 1)
-        n_steps = (len(self) // step_size) // 2
-
-        zeros_mask = np.tile(
-            np.concatenate((np.ones(step_size), np.zeros(step_size))), n_steps
-        )
-        ones_mask = np.tile(
-            np.concatenate((np.zeros(step_size), np.ones(step_size))), n_steps
-        )
-        zero_amplitude = np.sum(np.abs(self.qstate * zeros_mask) ** 2)
-        one_amplitude = np.sum(np.abs(self.qstate * ones_mask) ** 2)
-
-        measure = np.random.choice([0, 1], p=[zero_amplitude, one_amplitude])
+        psi = self._tensor()
+        idx_0, idx_1 = self._axis_slices(self.nqubits, target)
+        zero_amplitude = np.sum(np.abs(psi[idx_0]) ** 2)
+        one_amplitude = np.sum(np.abs(psi[idx_1]) ** 2)
+        total = zero_amplitude + one_amplitude
+        
+        # Outcomes whose probability is below rounding errors never happen, so they are not drawn
+        if one_amplitude <= StatevectorSimulator.ROUNDING * total:
+            measure = 0
+        elif zero_amplitude <= StatevectorSimulator.ROUNDING * total:
+            measure = 1
+        else:
+            measure = 1 if self.random.random() * total < one_amplitude else 0
+            self.random_draws += 1
         if measure == 0:
-            self.qstate[ones_mask == 1] = 0
+            psi[idx_1] = 0
         else:
-            self.qstate[zeros_mask == 1] = 0
-        self.qstate = self.qstate / linalg.norm(self.qstate)
+            psi[idx_0] = 0
+        self.qstate /= linalg.norm(self.qstate)
         
         return measure
     
+    def reset(self, target: int) -> None:
+        # Projection with renormalisation in place, the surviving half is then moved to |0>
+        assert 0 <= target < self.nqubits, 'qubit out of range'
+        
+        psi = self._tensor()
+        idx_0, idx_1 = self._axis_slices(self.nqubits, target)
+        if self._measure_z(target):
+            psi[idx_0] = psi[idx_1]
+            psi[idx_1] = 0
+    
+    def probabilities(self, targets: List[int]) -> np.ndarray:
+        assert all(0 <= t < self.nqubits for t in targets), 'qubit out of range'
+        assert len(set(targets)) == len(targets), 'targets must be different qubits'
+        
+        probs = np.abs(self._tensor()) ** 2
+        probs = probs.sum(axis=tuple(q for q in range(self.nqubits) if q not in targets))
+        order = sorted(targets)
+        probs = np.transpose(probs, [order.index(t) for t in targets])
+        return probs.reshape(-1)
+    
+    def sample(self, targets: List[int], shots: int) -> Counter:
+        probs = self.probabilities(targets)
+        counts = np.random.default_rng(self.random.getrandbits(64)).multinomial(shots, probs / probs.sum())
+        
+        result = Counter()
+        for outcome in np.flatnonzero(counts):
+            bits = tuple((int(outcome) >> (len(targets) - 1 - i)) & 1 for i in range(len(targets)))
+            result[bits] = int(counts[outcome])
+        return result
+    
     def measure(self, target: int, basis: int = Simulator.Z_BASIS) -> int:
         assert 0 <= target < self.nqubits, 'qubit out of range'
-
+        
         if basis == Simulator.Z_BASIS:
             return self._measure_z(target)
         else:
-            raise NotImplementedError('Statevector simulator only supports measure on Z basis')
\ No newline at end of file
+            raise NotImplementedError('Statevector simulator only supports measure on Z basis')
@@ -0,0 +1,182 @@
+from typing import Tuple
+import numpy as np
+from functools import partial
+from .base import Simulator
+from .clifford import VOP_WORDS, vop_gate
+
+class TableauSimulator(Simulator):
+    # Aaronson-Gottesman (CHP) stabilizer tableau. Rows 0..n-1 hold the destabilizers,
+    # rows n..2n-1 the stabilizers and row 2n is scratch space for deterministic
+    # measurements. The X and Z bits of every row are packed in 64 bit words.
+    WORD_SIZE = 64
+    
+    def __init__(self, nqubits: int) -> None:
+        super().__init__(nqubits)
+        
+        self.nqubits = nqubits
+        self.nwords = (nqubits + TableauSimulator.WORD_SIZE - 1) // TableauSimulator.WORD_SIZE
+        self.x = np.zeros((2 * nqubits + 1, self.nwords), dtype=np.uint64)
+        self.z = np.zeros((2 * nqubits + 1, self.nwords), dtype=np.uint64)
+        self.r = np.zeros(2 * nqubits + 1, dtype=np.uint8)
+        for i in range(nqubits):
+            w, m = self._column(i)
+            self.x[i, w] = m
+            self.z[i + nqubits, w] = m
+        self._gates = {
+            # Pauli gates
+            'i': self.I, 'x': self.X, 'y': self.Y, 'z': self.Z,
+            # Clifford gates
+            'h': self.H, 's': self.S, 'sdg': self.Sdg,
+            # Multiqubit gates
+            'cx': self.CX, 'cy': self.CY, 'cz': self.CZ, 'swap': self.Swap
+        }
+        for vop, word in enumerate(VOP_WORDS):
+            self._gates[vop_gate(vop)] = partial(self.apply_word, word)
+    
+    @staticmethod
+    def _column(qubit: int) -> Tuple[int, np.uint64]:
+        return qubit // TableauSimulator.WORD_SIZE, np.uint64(1 << (qubit % TableauSimulator.WORD_SIZE))
+    
+    def _bits(self, qubit: int) -> Tuple[np.ndarray, np.ndarray]:
+        assert 0 <= qubit < self.nqubits, 'qubit out of range'
+        w, m = self._column(qubit)
+        return (self.x[:, w] & m) != 0, (self.z[:, w] & m) != 0
+    
+    def _flip(self, table: np.ndarray, qubit: int, rows: np.ndarray) -> None:
+        w, m = self._column(qubit)
+        table[:, w] ^= rows.astype(np.uint64) * m
+    
+    def I(self, qubit: int) -> None:
+        assert 0 <= qubit < self.nqubits, 'qubit out of range'
+    
+    def X(self, qubit: int) -> None:
+        _, za = self._bits(qubit)
+        self.r ^= za
+    
+    def Y(self, qubit: int) -> None:
+        xa, za = self._bits(qubit)
+        self.r ^= xa ^ za
+    
+    def Z(self, qubit: int) -> None:
+        xa, _ = self._bits(qubit)
+        self.r ^= xa
+    
+    def H(self, qubit: int) -> None:
+        xa, za = self._bits(qubit)
+        self.r ^= xa & za
+        self._flip(self.x, qubit, xa ^ za)
+        self._flip(self.z, qubit, xa ^ za)
+    
+    def S(self, qubit: int) -> None:
+        xa, za = self._bits(qubit)
+        self.r ^= xa & za
+        self._flip(self.z, qubit, xa)
+    
+    def Sdg(self, qubit: int) -> None:
+        xa, za = self._bits(qubit)
+        self.r ^= xa & ~za
+        self._flip(self.z, qubit, xa)
+    
+    def apply_word(self, word: Tuple[str, ...], qubit: int) -> None:
+        for gate in word:
+            self._gates[gate](qubit)
+    
+    def CX(self, control: int, target: int) -> None:
+        assert control != target, 'control qubit must be different from target qubit'
+        xc, zc = self._bits(control)
+        xt, zt = self._bits(target)
+        self.r ^= xc & zt & ~(xt ^ zc)
+        self._flip(self.x, target, xc)
+        self._flip(self.z, control, zt)
+    
+    def CY(self, control: int, target: int) -> None:
+        self.Sdg(target)
+        self.CX(control, target)
+        self.S(target)
+    
+    def CZ(self, control: int, target: int) -> None:
+        assert control != target, 'control qubit must be different from target qubit'
+        xa, za = self._bits(control)
+        xb, zb = self._bits(target)
+        self.r ^= xa & xb & (za ^ zb)
+        self._flip(self.z, control, xb)
+        self._flip(self.z, target, xa)
+    
+    def Swap(self, control: int, target: int) -> None:
+        assert control != target, 'swap qubits must be different'
+        xa, za = self._bits(control)
+        xb, zb = self._bits(target)
+        self._flip(self.x, control, xa ^ xb)
+        self._flip(self.x, target, xa ^ xb)
+        self._flip(self.z, control, za ^ zb)
+        self._flip(self.z, target, za ^ zb)
+    
+    @staticmethod
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        return np.unpackbits(words.view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int64)
+    
+    def _rowsum(self, rows: np.ndarray, i: int) -> None:
+        # Replaces every row h in rows by the product of rows h and i, tracking the phase
+        x1, z1 = self.x[i], self.z[i]
+        x2, z2 = self.x[rows], self.z[rows]
+        plus = (x1 & z1 & ~x2 & z2) | (x1 & ~z1 & x2 & z2) | (~x1 & z1 & x2 & ~z2)
+        minus = (x1 & z1 & x2 & ~z2) | (x1 & ~z1 & ~x2 & z2) | (~x1 & z1 & x2 & z2)
+        phase = 2 * self.r[rows].astype(np.int64) + 2 * int(self.r[i]) + self._popcount(plus) - self._popcount(minus)
+        
+        self.r[rows] = (phase % 4 == 2)
+        self.x[rows] = x2 ^ x1
+        self.z[rows] = z2 ^ z1
+    
+    def measure_z(self, target: int) -> int:
+        n = self.nqubits
+        xa, _ = self._bits(target)
+        w, m = self._column(target)
+        
+        stabilizers = np.flatnonzero(xa[n:2 * n])
+        if stabilizers.size > 0:
+            p = int(stabilizers[0]) + n
+            rows = np.flatnonzero(xa[:2 * n])
+            rows = rows[rows != p]
+            if rows.size > 0:
+                self._rowsum(rows, p)
+            
+            self.x[p - n], self.z[p - n], self.r[p - n] = self.x[p], self.z[p], self.r[p]
+            self.x[p] = 0
+            self.z[p] = 0
+            self.z[p, w] = m
+            self.r[p] = self.random.getrandbits(1)
+            self.random_draws += 1
+            return int(self.r[p])
+        
+        scratch = 2 * n
+        self.x[scratch] = 0
+        self.z[scratch] = 0
+        self.r[scratch] = 0
+        for i in np.flatnonzero(xa[:n]):
+            self._rowsum(np.array([scratch]), int(i) + n)
+        return int(self.r[scratch])
+    
+    def copy(self) -> 'TableauSimulator':
+        sim = TableauSimulator(self.nqubits)
+        sim.x, sim.z, sim.r = self.x.copy(), self.z.copy(), self.r.copy()
+        sim.random = self.random
+        sim.random_draws = self.random_draws
+        return sim
+    
+    def measure(self, target: int, basis: int = Simulator.Z_BASIS) -> int:
+        assert 0 <= target < self.nqubits, 'qubit out of range'
+        
+        if basis == Simulator.X_BASIS:
+            self.H(target)
+            eta = self.measure_z(target)
+            self.H(target)
+        elif basis == Simulator.Y_BASIS:
+            self.Sdg(target)
+            self.H(target)
+            eta = self.measure_z(target)
+            self.H(target)
+            self.S(target)
+        else:
+            eta = self.measure_z(target)
+        
+        return eta